@@ -1,46 +1,89 @@
-from flask import Flask, render_template, request, redirect, url_for, flash, session, jsonify
-from flask_mysqldb import MySQL
+from flask import Flask, Response, render_template, request, redirect, url_for, flash, session, jsonify, g
 from flask_bootstrap import Bootstrap
 from passlib.hash import bcrypt
 from functools import wraps
-import mysql.connector as sql
+from json import dumps
+from time import perf_counter
+import os
 
-from config import _mysql_user, _mysql_password, _secret_key
+from config import _secret_key
+from storage import BACKENDS, open_storage
 from sql_util import Table, nodes
 from forms import RegistrationForm, LoginForm, TransactionForm
-from blockchain import Blockchain
+from blockstore import BlockStore
+from chain_state import ChainState
+from codec import BLOCK_MIMETYPE, decode_block, encode_block, encode_frame
+from compression import COMPRESS_MIN_SIZE, DecompressRequests, compress_response
+from metrics import CONTENT_TYPE, HTTP_REQUEST_SECONDS, REGISTRY, watch_pool
+from snapshot import SNAPSHOT_INTERVAL
 from wallet import Wallet
+from merkle import merkle_proof
+from transaction import transaction_id
 
 
 app = Flask(__name__)
 
 app.config['SECRET_KEY'] = _secret_key
 
-app.config['MYSQL_HOST'] = 'localhost'
-app.config['MYSQL_USER'] = _mysql_user
-app.config['MYSQL_PASSWORD'] = _mysql_password
 app.config['MYSQL_DB'] = 'jiocoin_users'
-app.config['MYSQL_CURSORCLASS'] = 'DictCursor'
+app.config['STORAGE'] = 'mysql'
+app.config['DATA_DIR'] = '.'
+app.config['DB_POOL_SIZE'] = 5
+app.config['DB_POOL_TIMEOUT'] = 10
 app.config['BOOTSTRAP_SERVE_LOCAL'] = True
+app.config['COMPRESS_MIN_SIZE'] = COMPRESS_MIN_SIZE
+app.config['PORT'] = 5000
+app.config['MINING_WORKERS'] = None
+app.config['PEER_TIMEOUT'] = 5
+app.config['MEMPOOL_SIZE'] = 10000
+app.config['BLOCK_STORE'] = False
+app.config['BODY_CACHE_SIZE'] = 256
+app.config['SNAPSHOT_INTERVAL'] = SNAPSHOT_INTERVAL
+app.config['TRUSTED_SNAPSHOT'] = None
+app.config['DASHBOARD_BLOCKS'] = 20
+
+
+def create_chain_state():
+    """
+    Creates the chain state of the node from the settings of the app. The node database and the block store
+    are named after the PORT setting. The blockchain is loaded by the first request using it.
+    :return: ChainState object
+    """
+    node_name = f"jiocoin_{app.config['PORT']}"
+    node_db = open_storage(app.config['STORAGE'], node_name, app.config['DB_POOL_SIZE'],
+                           app.config['DB_POOL_TIMEOUT'], app.config['DATA_DIR'])
+    watch_pool('node', node_db)
+    block_store = None
+    if app.config['BLOCK_STORE']:
+        block_store = BlockStore(os.path.join(app.config['DATA_DIR'], f'{node_name}.blocks'))
+    return ChainState(mysql,
+                      node_db,
+                      app.config['MINING_WORKERS'],
+                      app.config['PEER_TIMEOUT'],
+                      app.config['MEMPOOL_SIZE'],
+                      block_store,
+                      app.config['BODY_CACHE_SIZE'],
+                      app.config['SNAPSHOT_INTERVAL'],
+                      app.config['TRUSTED_SNAPSHOT'])
+
 
 Bootstrap(app)
-mysql = MySQL(app)
+app.wsgi_app = DecompressRequests(app.wsgi_app)
+port = app.config['PORT']
+mysql = open_storage(app.config['STORAGE'], app.config['MYSQL_DB'], app.config['DB_POOL_SIZE'],
+                     app.config['DB_POOL_TIMEOUT'], app.config['DATA_DIR'])
+watch_pool('users', mysql)
+chain_state = create_chain_state()
 
 
 def get_blockchain(email):
     """
-    Creates the instance of Blockchain class.
+    Gets the blockchain shared by all the requests to the node, with the user as the host.
+    Used as a context manager which holds the lock on the blockchain until the block exits.
     :param email: The email of the user.
     :return: Blockchain object
     """
-    conn = sql.connect(
-        host='localhost',
-        user=_mysql_user,
-        password=_mysql_password,
-        database='jiocoin_' + str(port)
-    )
-    blockchain = Blockchain(email, mysql, conn)
-    return blockchain
+    return chain_state.use(email)
 
 
 def get_balance(email):
@@ -49,11 +92,21 @@ def get_balance(email):
     :param email: The email of the user.
     :return: Balance of the user account.
     """
-    blockchain = get_blockchain(email)
-    balance = blockchain.calculate_balance()
+    with get_blockchain(email) as blockchain:
+        balance = blockchain.calculate_balance()
     return balance
 
 
+def block_to_dict(block, headers_only=False):
+    """
+    Converts a block to a dictionary to be sent to the peer nodes.
+    :param block: The block to be converted.
+    :param headers_only: Determines whether to leave out the transactions of the block.
+    :return: dictionary - the block attributes.
+    """
+    return block.to_dict(not headers_only)
+
+
 def broadcast_block_helper(block, blockchain, peer_chain_index):
     """
     Helper function for the broadcast_block function
@@ -75,6 +128,53 @@ def broadcast_block_helper(block, blockchain, peer_chain_index):
         return jsonify(response), 409
 
 
+@app.before_request
+def start_timer():
+    """
+    Notes the time the request started at, to record its latency in the metrics.
+    :return: None.
+    """
+    g.request_start = perf_counter()
+
+
+@app.after_request
+def note_status(response):
+    """
+    Notes the status code of the response, to record it with the latency of the request.
+    :param response: The response of the view.
+    :return: The response.
+    """
+    g.response_status = response.status_code
+    return response
+
+
+@app.teardown_request
+def record_latency(exc=None):
+    """
+    Records the latency of the request in the metrics, by route, method and status code. It is recorded when
+    the request is torn down, so that the requests which raised an exception are recorded with status code 500.
+    The latency of a streamed response covers the view only, not the streaming of its body.
+    :param exc: The exception raised while handling the request, if any.
+    :return: None.
+    """
+    start = g.pop('request_start', None)
+    status = g.pop('response_status', 500)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(perf_counter() - start, (route, request.method, str(500 if exc else status)))
+
+
+@app.after_request
+def compress(response):
+    """
+    Compresses the response body with the gzip, deflate or zstd encoding accepted by the client.
+    Bodies smaller than the COMPRESS_MIN_SIZE setting are sent uncompressed.
+    :param response: The response of the view.
+    :return: The response, compressed if the client accepts it.
+    """
+    return compress_response(response, request.headers.get('Accept-Encoding', ''), app.config['COMPRESS_MIN_SIZE'])
+
+
 def is_loggedin(func):
     """
     Checks whether the user is logged in or not.
@@ -126,15 +226,7 @@ def register():
     """
     form = RegistrationForm(request.form)
 
-    users = Table("users", mysql,
-                  ("email", "VARCHAR", 50, "UNIQUE"),
-                  ("name", "VARCHAR", 50, ""),
-                  ("node", "VARCHAR", 80, "UNIQUE"),
-                  ("password", "VARCHAR", 100, ""),
-                  ("public_key", "VARCHAR", 2048, ""),
-                  ("has_wallet", "BOOL", "", ""),
-                  ("db_created", "BOOL", "", "")
-                  )
+    users = Table("users", mysql)
 
     if form.validate_on_submit():
         name = form.name.data
@@ -143,7 +235,7 @@ def register():
 
         if users.is_new_user(email):
             password = bcrypt.hash(form.password.data)
-            is_db_created = Table.create_db("jiocoin_" + str(port))
+            is_db_created = Table.create_db("jiocoin_" + str(port), mysql)
             try:
                 users.insert_data(email, name, node, password, 'NULL', 0, is_db_created)
             except Exception as e:
@@ -176,15 +268,7 @@ def login():
         email = form.email.data
         input_password = form.password.data
 
-        users = Table("users", mysql,
-                      ("email", "VARCHAR", 50, "UNIQUE"),
-                      ("name", "VARCHAR", 50, ""),
-                      ("node", "VARCHAR", 80, "UNIQUE"),
-                      ("password", "VARCHAR", 100, ""),
-                      ("public_key", "VARCHAR", 2048, ""),
-                      ("has_wallet", "BOOL", "", ""),
-                      ("db_created", "BOOL", "", "")
-                      )
+        users = Table("users", mysql)
 
         user = users.get_one('email', email)
         if user is None:
@@ -218,17 +302,21 @@ def logout():
 def dashboard():
     """
     Renders the dashboard with information from the blockchain and open transactions.
+    Only the latest DASHBOARD_BLOCKS blocks are shown. Their transactions are read while the lock on the blockchain
+    is held, so that a reorganization cannot remove them before the page is rendered.
     :return: Returns the dashboard page.
     """
     email = session['email']
-    blockchain = get_blockchain(email)
-    balance = get_balance(email)
+    with get_blockchain(email) as blockchain:
+        balance = blockchain.calculate_balance()
+        chain = [block_to_dict(block) for block in blockchain.chain[-app.config['DASHBOARD_BLOCKS']:]]
+        open_transactions = list(blockchain.open_transactions)
 
     return render_template('dashboard.html',
                            session=session,
                            balance=balance,
-                           chain=blockchain.chain,
-                           open_transactions=blockchain.open_transactions)
+                           chain=chain,
+                           open_transactions=open_transactions)
 
 
 @app.route('/transaction', methods=['GET', 'POST'])
@@ -244,22 +332,13 @@ def transaction():
 
     sender = session['email']
 
-    blockchain = get_blockchain(sender)
     balance = get_balance(sender)
 
     if form.validate_on_submit():
         recipient = form.email.data
         amount = form.amount.data
 
-        users = Table("users", mysql,
-                      ("email", "VARCHAR", 50, "UNIQUE"),
-                      ("name", "VARCHAR", 50, ""),
-                      ("node", "VARCHAR", 80, "UNIQUE"),
-                      ("password", "VARCHAR", 100, ""),
-                      ("public_key", "VARCHAR", 2048, ""),
-                      ("has_wallet", "BOOL", "", ""),
-                      ("db_created", "BOOL", "", "")
-                      )
+        users = Table("users", mysql)
 
         if session['has_conflict']:
             flash('Blockchain out of sync. Resolve conflict !', 'danger')
@@ -276,7 +355,8 @@ def transaction():
             wallet.load_keys(port)
             signature = wallet.sign_transaction(sender, recipient, amount)
             node_list = nodes(mysql, sender)
-            if blockchain.add_transactions(sender, recipient, amount, signature, node_list, True):
+            added = chain_state.add_transaction(sender, sender, recipient, amount, signature, node_list)
+            if added:
                 flash('Transaction successfully added for mining !', 'success')
             else:
                 flash('Transaction failed. Signature could not be verified', 'danger')
@@ -295,9 +375,16 @@ def mine():
     """
     if not session['has_conflict']:
         email = session['email']
-        blockchain = get_blockchain(email)
         node_list = nodes(mysql, email)
-        session['has_conflict'] = blockchain.mine_block(node_list)
+        has_conflict = chain_state.mine(email, node_list)
+        if has_conflict is None:
+            return '''
+                        <div class="alert alert-danger">
+                            <button type="button" class="close" data-dismiss="alert">&times;</button>
+                            <h5>Mining failed ! The blockchain changed while mining. Try again.<h5>
+                        </div>
+                    '''
+        session['has_conflict'] = has_conflict
         return '''
                     <div class="alert alert-success">
                         <button type="button" class="close" data-dismiss="alert">&times;</button>
@@ -319,43 +406,42 @@ def broadcast_block():
     Broadcasts the newly mined block to the peer nodes.
     :return: Response to the request.
     """
-    values = request.get_json()
+    if request.mimetype == BLOCK_MIMETYPE:
+        try:
+            values = {'block': block_to_dict(decode_block(request.get_data())), 'node': request.args.get('node')}
+        except ValueError:
+            response = {'msg': 'Invalid block encoding !'}
+            return jsonify(response), 400
+    else:
+        values = request.get_json()
 
     if not values:
         response = {'msg': 'No data found !'}
         return jsonify(response), 400
 
     reqs = ['block', 'node']
-    if not all(req in values for req in reqs):
+    if not all(values.get(req) is not None for req in reqs):
         response = {'msg': 'Data missing !'}
         return jsonify(response), 400
 
-    users = Table("users", mysql,
-                  ("email", "VARCHAR", 50, "UNIQUE"),
-                  ("name", "VARCHAR", 50, ""),
-                  ("node", "VARCHAR", 80, "UNIQUE"),
-                  ("password", "VARCHAR", 100, ""),
-                  ("public_key", "VARCHAR", 2048, ""),
-                  ("has_wallet", "BOOL", "", ""),
-                  ("db_created", "BOOL", "", "")
-                  )
+    users = Table("users", mysql)
 
     user = users.get_one('node', values['node'])
 
-    blockchain = get_blockchain(user['email'])
-
     block = values['block']
 
-    try:
-        return broadcast_block_helper(block, blockchain, blockchain.chain[-1].index)
-    except IndexError:
-        return broadcast_block_helper(block, blockchain, 0)
+    with get_blockchain(user['email']) as blockchain:
+        try:
+            return broadcast_block_helper(block, blockchain, blockchain.chain[-1].index)
+        except IndexError:
+            return broadcast_block_helper(block, blockchain, 0)
 
 
 @app.route('/broadcast-tnx', methods=['POST'])
 def broadcast_tnx():
     """
-    Broadcasts the new transactions to the peer nodes.
+    Broadcasts the new transactions to the peer nodes. A transaction which is already known is acknowledged
+    without being added again.
     :return: Response to the request.
     """
 
@@ -369,25 +455,19 @@ def broadcast_tnx():
         response = {'msg': 'Data missing !'}
         return jsonify(response), 400
 
-    users = Table("users", mysql,
-                  ("email", "VARCHAR", 50, "UNIQUE"),
-                  ("name", "VARCHAR", 50, ""),
-                  ("node", "VARCHAR", 80, "UNIQUE"),
-                  ("password", "VARCHAR", 100, ""),
-                  ("public_key", "VARCHAR", 2048, ""),
-                  ("has_wallet", "BOOL", "", ""),
-                  ("db_created", "BOOL", "", "")
-                  )
+    users = Table("users", mysql)
 
     user = users.get_one('node', values['node'])
 
-    blockchain = get_blockchain(user['email'])
-
     tnx = values['transaction']
-    success = blockchain.add_transactions(tnx['sender'],
-                                          tnx['recipient'],
-                                          tnx['amount'],
-                                          tnx['signature'])
+    with get_blockchain(user['email']) as blockchain:
+        if blockchain.knows_transaction(transaction_id(tnx)):
+            return '', 200
+        success = blockchain.add_transactions(tnx['sender'],
+                                              tnx['recipient'],
+                                              tnx['amount'],
+                                              tnx['signature'],
+                                              nonce=tnx.get('nonce', 0))
     if success:
         return '', 200
     else:
@@ -399,6 +479,62 @@ def broadcast_tnx():
 def get_chain():
     """
     Gets the blockchain of the peer nodes.
+    The blocks are selected with the from and to query parameters (indexes starting from 1, both included) or the
+    start field of the JSON body, and limited to the limit query parameter. With headers=1 the transactions are
+    left out, and with format=ndjson the blocks are sent one per line as newline-delimited JSON. With
+    format=binary the blocks are sent in the compact binary encoding, each prefixed with its length, and
+    always include their transactions. With a block store the binary blocks are read straight from its segments.
+    The blocks are converted while the lock on the blockchain is held, so that a reorganization cannot remove
+    their transactions before the response is sent.
+    :return: Response to the request.
+    """
+    values = request.get_json(silent=True) or {}
+    start = max(request.args.get('from', values.get('start', 1), type=int), 1)
+    end = request.args.get('to', type=int)
+    limit = request.args.get('limit', type=int)
+    headers_only = request.args.get('headers', '0').lower() in ('1', 'true')
+    binary = request.args.get('format') == 'binary'
+
+    with get_blockchain(None) as blockchain:
+        chain = blockchain.chain
+        end = len(chain) if end is None else min(end, len(chain))
+        if limit is not None:
+            end = min(end, start - 1 + max(limit, 0))
+        if binary and blockchain.block_store is not None:
+            frames = [bytes(blockchain.block_store.read_frame(height)) for height in range(start, end + 1)]
+        elif binary:
+            frames = [encode_frame(encode_block(chain[position])) for position in range(start - 1, end)]
+        else:
+            dict_chain = [block_to_dict(chain[position], headers_only) for position in range(start - 1, end)]
+
+    if binary:
+        return Response(iter(frames), mimetype='application/octet-stream'), 200
+
+    if request.args.get('format') == 'ndjson':
+        return Response((dumps(block) + '\n' for block in dict_chain), mimetype='application/x-ndjson'), 200
+
+    return jsonify(dict_chain), 200
+
+
+@app.route('/tip', methods=['GET'])
+def get_tip():
+    """
+    Gets the height and hash of the last block of the blockchain.
+    :return: Response to the request.
+    """
+    with get_blockchain(None) as blockchain:
+        try:
+            tip_hash = blockchain.chain[-1].hash
+        except IndexError:
+            tip_hash = None
+        response = {'height': len(blockchain.chain), 'hash': tip_hash}
+    return jsonify(response), 200
+
+
+@app.route('/locate', methods=['POST'])
+def locate():
+    """
+    Finds the fork point between the blockchain and a peer's chain from the peer's block locator.
     :return: Response to the request.
     """
     values = request.get_json()
@@ -407,26 +543,89 @@ def get_chain():
         response = {'msg': 'No data found !'}
         return jsonify(response), 400
 
-    if 'node' not in values:
+    if 'locator' not in values:
         response = {'msg': 'Data missing !'}
         return jsonify(response), 400
 
-    users = Table("users", mysql,
-                  ("email", "VARCHAR", 50, "UNIQUE"),
-                  ("name", "VARCHAR", 50, ""),
-                  ("node", "VARCHAR", 80, "UNIQUE"),
-                  ("password", "VARCHAR", 100, ""),
-                  ("public_key", "VARCHAR", 2048, ""),
-                  ("has_wallet", "BOOL", "", ""),
-                  ("db_created", "BOOL", "", "")
-                  )
+    with get_blockchain(None) as blockchain:
+        response = {'height': blockchain.locate(values['locator'])}
+    return jsonify(response), 200
 
-    user = users.get_one('node', values['node'])
 
-    blockchain = get_blockchain(user['email'])
-    chain = blockchain.chain
-    dict_chain = [block.__dict__.copy() for block in chain]
-    return jsonify(dict_chain), 200
+@app.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Gets the performance metrics of the node in the Prometheus text format.
+    :return: Response to the request.
+    """
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE), 200
+
+
+@app.route('/snapshot', methods=['GET'])
+def get_snapshot():
+    """
+    Gets the latest snapshot of the balances of all the addresses, with the height and hash of its block and
+    its digest, so that a new peer node can start from it. The snapshot with the digest in the request is
+    returned instead, if the request has one.
+    :return: Response to the request.
+    """
+    values = request.get_json(silent=True) or {}
+    digest = request.args.get('digest', values.get('digest'))
+    with get_blockchain(None) as blockchain:
+        snapshot = blockchain.latest_snapshot(digest)
+
+    if snapshot is None:
+        response = {'msg': 'Snapshot not found !'}
+        return jsonify(response), 404
+
+    return jsonify(snapshot.to_dict()), 200
+
+
+@app.route('/proof/<int:block_index>/<int:tnx_index>', methods=['GET'])
+def get_proof(block_index, tnx_index):
+    """
+    Gets the Merkle proof that a transaction is included in a block.
+    :param block_index: The index of the block in the blockchain, starting from 1.
+    :param tnx_index: The position of the transaction in the block, starting from 1.
+    :return: Response to the request.
+    """
+    with get_blockchain(None) as blockchain:
+        if not 1 <= block_index <= len(blockchain.chain):
+            response = {'msg': 'Block not found !'}
+            return jsonify(response), 404
+
+        block = blockchain.chain[block_index - 1]
+        transactions = block.transactions
+        if not 1 <= tnx_index <= len(transactions):
+            response = {'msg': 'Transaction not found !'}
+            return jsonify(response), 404
+
+        response = {'block_hash': block.hash,
+                    'merkle_root': block.merkle_root,
+                    'transaction': dict(transactions[tnx_index - 1]),
+                    'proof': merkle_proof(transactions, tnx_index - 1)}
+    return jsonify(response), 200
+
+
+@app.route('/tnx/<tnx_id>', methods=['GET'])
+def get_transaction(tnx_id):
+    """
+    Looks up a transaction by its ID in the open transactions and in the blockchain.
+    :param tnx_id: The ID of the transaction.
+    :return: Response to the request.
+    """
+    with get_blockchain(None) as blockchain:
+        found = blockchain.find_transaction(tnx_id)
+
+    if found is None:
+        response = {'msg': 'Transaction not found !'}
+        return jsonify(response), 404
+
+    transaction, block_index = found
+    response = {'transaction': transaction,
+                'status': 'open' if block_index is None else 'confirmed',
+                'block': block_index}
+    return jsonify(response), 200
 
 
 @app.route('/resolve-conflicts', methods=['POST'])
@@ -438,9 +637,9 @@ def resolve_conflicts():
     local copy is updated otherwise local copy is kept unchanged.
     """
     email = session['email']
-    blockchain = get_blockchain(email)
     node_list = nodes(mysql, email)
-    if blockchain.resolve(node_list):
+    updated = chain_state.resolve(email, node_list)
+    if updated:
         session['has_conflict'] = False
         return '''
                     <div class="alert alert-success">
@@ -520,7 +719,53 @@ def load_wallet():
 
 if __name__ == '__main__':
     from argparse import ArgumentParser
+    import sys
     parser = ArgumentParser()
-    parser.add_argument('-p', '--port', type=int, default=5000)
-    port = parser.parse_args().port
+    parser.add_argument('-p', '--port', type=int, default=app.config['PORT'])
+    parser.add_argument('--storage', choices=BACKENDS, default=app.config['STORAGE'])
+    parser.add_argument('--data-dir', default=app.config['DATA_DIR'])
+    parser.add_argument('--pool-size', type=int, default=app.config['DB_POOL_SIZE'])
+    parser.add_argument('--pool-timeout', type=float, default=app.config['DB_POOL_TIMEOUT'])
+    parser.add_argument('--mining-workers', type=int, default=app.config['MINING_WORKERS'])
+    parser.add_argument('--peer-timeout', type=float, default=app.config['PEER_TIMEOUT'])
+    parser.add_argument('--mempool-size', type=int, default=app.config['MEMPOOL_SIZE'])
+    parser.add_argument('--block-store', action='store_true',
+                        help='Keep the blocks in append-only segment files in the data directory.')
+    parser.add_argument('--body-cache-size', type=int, default=app.config['BODY_CACHE_SIZE'],
+                        help='The number of block bodies kept in memory.')
+    parser.add_argument('--snapshot-interval', type=int, default=app.config['SNAPSHOT_INTERVAL'],
+                        help='The number of blocks between two snapshots of the balances, 0 to take no snapshot.')
+    parser.add_argument('--dashboard-blocks', type=int, default=app.config['DASHBOARD_BLOCKS'],
+                        help='The number of latest blocks shown on the dashboard.')
+    parser.add_argument('--trusted-snapshot', metavar='DIGEST', default=app.config['TRUSTED_SNAPSHOT'],
+                        help='Start an empty chain from the snapshot of a peer node with this digest when resolving.')
+    parser.add_argument('--verify-snapshot', action='store_true',
+                        help='Check the latest snapshot against a full replay of the chain and exit.')
+    args = parser.parse_args()
+    app.config.update(PORT=args.port,
+                      STORAGE=args.storage,
+                      DATA_DIR=args.data_dir,
+                      DB_POOL_SIZE=args.pool_size,
+                      DB_POOL_TIMEOUT=args.pool_timeout,
+                      MINING_WORKERS=args.mining_workers,
+                      PEER_TIMEOUT=args.peer_timeout,
+                      MEMPOOL_SIZE=args.mempool_size,
+                      BLOCK_STORE=args.block_store,
+                      BODY_CACHE_SIZE=args.body_cache_size,
+                      SNAPSHOT_INTERVAL=args.snapshot_interval,
+                      DASHBOARD_BLOCKS=args.dashboard_blocks,
+                      TRUSTED_SNAPSHOT=args.trusted_snapshot)
+    port = args.port
+    mysql = open_storage(args.storage, app.config['MYSQL_DB'], args.pool_size, args.pool_timeout, args.data_dir)
+    watch_pool('users', mysql)
+    Table.create_db('jiocoin_' + str(port), mysql)
+    chain_state = create_chain_state()
+    blockchain = chain_state.load()
+    if args.verify_snapshot:
+        snapshot = blockchain.latest_snapshot()
+        if snapshot is None:
+            sys.exit('No snapshot to verify')
+        verified = blockchain.verify_snapshot(snapshot)
+        print(f'{snapshot}: {"verified" if verified else "does not match the chain"}')
+        sys.exit(0 if verified else 1)
     app.run(host='localhost', port=port, debug=True)
@@ -0,0 +1,304 @@
+"""
+Micro-benchmarks of the hot paths of the node.
+
+Runs every benchmark, prints the timings and records them as JSON, so that the results of two commits can be
+compared:
+
+    python bench.py --output before.json
+    python bench.py --output after.json --compare before.json
+
+The storage benchmarks run against the SQLite storage backend in a temporary directory instead of a MySQL server.
+"""
+from argparse import ArgumentParser
+from itertools import count
+from json import dump, load
+from platform import python_version
+from statistics import median
+from subprocess import DEVNULL, CalledProcessError, check_output
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+import gc
+import os
+import sys
+import tracemalloc
+
+from block import Block
+from blockchain import Blockchain
+from blockstore import BlockStore
+from codec import decode_block, encode_block
+from fixtures import GENESIS_HASH, HOST, fake_signature, make_block, make_chain, make_storage
+from helper import hash_block_data
+from transaction import Transaction, TransactionColumns
+from wallet import Wallet
+
+
+def forget_hashes(chain):
+    """
+    Drops the header hashes memoized on the blocks, so that they are computed again.
+    :param chain: The list of blocks.
+    :return: None.
+    """
+    for block in chain:
+        block.header_hash = None
+
+
+def measure(function, repeat, number=1, setup=None):
+    """
+    Times a function. The setup runs before every timed repeat and is not timed.
+    :param function: The function to be timed. It receives the result of the setup, if any.
+    :param repeat: The number of timed repeats.
+    :param number: The number of calls of the function in each repeat.
+    :param setup: The function preparing each repeat.
+    :return: dictionary - the median and the minimum time of a single call in seconds.
+    """
+    timings = []
+    for _ in range(repeat):
+        args = (setup(),) if setup is not None else ()
+        start = perf_counter()
+        for _ in range(number):
+            function(*args)
+        timings.append((perf_counter() - start) / number)
+    return {'seconds': median(timings), 'min': min(timings), 'repeat': repeat, 'number': number}
+
+
+def bench_hash_block_data(options, directory):
+    """
+    Measures the hash of a block header with 100 transactions.
+    """
+    block = make_block(1, GENESIS_HASH, 100)
+
+    def run():
+        block.header_hash = None
+        hash_block_data(block)
+    return {'hash_block_data': measure(run, options.repeat, 10000)}
+
+
+def bench_mine_block(options, directory):
+    """
+    Measures the hash rate of mine_block, including the save of the mined block, at several difficulties.
+    """
+    results = {}
+    for difficulty in options.difficulties:
+        users = make_storage(directory, f'users_mine_{difficulty}')
+        blockchain = Blockchain(HOST, users, make_storage(directory, f'node_mine_{difficulty}'),
+                                difficulty, options.mining_workers)
+        attempts = 0
+        start = perf_counter()
+        for _ in range(options.blocks_per_difficulty):
+            blockchain.mine_block([])
+            attempts += blockchain.mining_attempts
+        elapsed = perf_counter() - start
+        results[f'mine_block[difficulty={difficulty}]'] = {
+            'seconds': elapsed / options.blocks_per_difficulty,
+            'hashes_per_second': attempts / elapsed,
+            'number': options.blocks_per_difficulty}
+    return results
+
+
+def bench_is_valid_chain(options, directory):
+    """
+    Measures the validation of synthetic chains of several lengths, with no validated checkpoint and no memoized
+    block hashes.
+    """
+    results = {}
+    users = make_storage(directory, 'users_valid')
+    blockchain = Blockchain(HOST, users, make_storage(directory, 'node_valid'), difficulty=0)
+    for length in options.chain_sizes:
+        chain = make_chain(length)
+
+        def run(_):
+            if not blockchain.is_valid_chain(chain, False, 0):
+                raise AssertionError('The synthetic chain is not valid')
+        results[f'is_valid_chain[blocks={length}]'] = measure(run, options.repeat, setup=lambda: forget_hashes(chain))
+    return results
+
+
+def bench_calculate_balance(options, directory):
+    """
+    Measures the balance of the host with 1000 blocks in the ledger and 1000 open transactions of the host.
+    """
+    users = make_storage(directory, 'users_balance')
+    blockchain = Blockchain(HOST, users, make_storage(directory, 'node_balance'), difficulty=0)
+    blockchain.chain = make_chain(1000, 4)
+    blockchain.ledger.rebuild(blockchain.chain)
+    for position in range(1000):
+        blockchain.open_transactions.add(
+            Transaction(position, HOST, 'user@jiocoin.bench', 0.01, fake_signature(0, position)).to_dict())
+    return {'calculate_balance': measure(blockchain.calculate_balance, options.repeat, 10000)}
+
+
+def bench_signatures(options, directory):
+    """
+    Measures the signature of a transaction, and its verification with and without the memo of verified signatures.
+    """
+    wallet = Wallet()
+    public_key = wallet.create_keys()
+    Wallet.public_keys.put(HOST, public_key)
+    signature = wallet.sign_transaction(HOST, 'user@jiocoin.bench', 1.0)
+    transaction = Transaction(0, HOST, 'user@jiocoin.bench', 1.0, signature).to_dict()
+    users = make_storage(directory, 'users_signatures')
+
+    def verify():
+        Wallet.verified_signatures.clear()
+        if not Wallet.verify_signature(transaction, users):
+            raise AssertionError('The signature is not valid')
+
+    return {'sign_transaction': measure(lambda: wallet.sign_transaction(HOST, 'user@jiocoin.bench', 1.0),
+                                        options.repeat, 50),
+            'verify_signature': measure(verify, options.repeat, 200),
+            'verify_signature[memoized]': measure(lambda: Wallet.verify_signature(transaction, users),
+                                                  options.repeat, 10000)}
+
+
+def bench_storage(options, directory):
+    """
+    Measures the save of a whole chain to an empty database, the save of one more block, and the load of the chain,
+    with the blocks in the database and in a block store.
+    """
+    chain = make_chain(options.storage_blocks, 4)
+    users = make_storage(directory, 'users_storage')
+    runs = count()
+
+    def empty_node(block_store=False):
+        run = next(runs)
+        store = BlockStore(os.path.join(directory, f'blocks_{run}')) if block_store else None
+        blockchain = Blockchain(HOST, users, make_storage(directory, f'node_storage_{run}'), difficulty=0,
+                                block_store=store)
+        blockchain.chain = list(chain)
+        blockchain.ledger.rebuild(blockchain.chain)
+        return blockchain
+
+    def saved_node(block_store=False):
+        blockchain = empty_node(block_store)
+        blockchain.save_data()
+        return blockchain
+
+    def save_one_block(blockchain):
+        block = make_block(len(blockchain.chain) + 1, blockchain.chain[-1].hash, 4)
+        blockchain.chain.append(block)
+        blockchain.ledger.apply_block(block)
+        blockchain.save_data()
+
+    return {f'save_data[blocks={options.storage_blocks}]': measure(lambda blockchain: blockchain.save_data(),
+                                                                   options.repeat, setup=empty_node),
+            'save_data[one block]': measure(save_one_block, options.repeat, setup=saved_node),
+            f'load_data[blocks={options.storage_blocks}]': measure(lambda blockchain: blockchain.load_data(),
+                                                                   options.repeat, setup=saved_node),
+            f'save_data[block store, blocks={options.storage_blocks}]': measure(
+                lambda blockchain: blockchain.save_data(), options.repeat, setup=lambda: empty_node(True)),
+            f'load_data[block store, blocks={options.storage_blocks}]': measure(
+                lambda blockchain: blockchain.load_data(), options.repeat, setup=lambda: saved_node(True))}
+
+
+def bench_memory(options, directory):
+    """
+    Measures the memory and the build time of the transactions of 1000 blocks with 10 transactions each,
+    as dictionaries and in columnar transaction stores.
+    """
+    bodies = [[Transaction(position, f'user{position % 50}@jiocoin.bench', HOST, 1.0,
+                           fake_signature(height, position)).to_dict()
+               for position in range(10)] for height in range(1000)]
+    encoded = [encode_block(Block(1, GENESIS_HASH, '0', transactions)) for transactions in bodies]
+    results = {}
+    builders = (('dict', lambda: [decode_block(data).transactions for data in encoded]),
+                ('columnar', lambda: [TransactionColumns(decode_block(data).transactions) for data in encoded]))
+    for name, build in builders:
+        gc.collect()
+        tracemalloc.start()
+        start = perf_counter()
+        kept = build()
+        elapsed = perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        del kept
+        results[f'transaction bodies[{name}]'] = {'seconds': elapsed,
+                                                  'bytes_per_transaction': size / (len(bodies) * 10),
+                                                  'number': 1}
+    return results
+
+
+BENCHMARKS = {'hash': bench_hash_block_data,
+              'mine': bench_mine_block,
+              'validate': bench_is_valid_chain,
+              'balance': bench_calculate_balance,
+              'signatures': bench_signatures,
+              'storage': bench_storage,
+              'memory': bench_memory}
+
+
+def current_commit():
+    """
+    Gets the commit of the working tree, to label the results.
+    :return: string - the abbreviated commit hash, None if it is not available.
+    """
+    try:
+        return check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True, stderr=DEVNULL,
+                            cwd=os.path.dirname(os.path.abspath(__file__))).strip()
+    except (OSError, CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change of each benchmark against the baseline results.
+    :param results: The results of the current run.
+    :param baseline: The results of the baseline run.
+    :param threshold: The relative slowdown from which a benchmark is reported as a regression.
+    :return: list - the names of the regressed benchmarks.
+    """
+    regressions = []
+    print(f'\nCompared with {baseline.get("commit")}:')
+    for name, result in results['results'].items():
+        before = baseline['results'].get(name)
+        if before is None:
+            print(f'  {name:40} new')
+            continue
+        change = result['seconds'] / before['seconds'] - 1
+        flag = ''
+        if change > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'  {name:40} {before["seconds"] * 1e3:12.4f} ms -> {result["seconds"] * 1e3:12.4f} ms '
+              f'{change:+8.1%}{flag}')
+    return regressions
+
+
+def main():
+    parser = ArgumentParser(description='Runs the micro-benchmarks of the node.')
+    parser.add_argument('--output', default='bench.json', help='The file the results are written to.')
+    parser.add_argument('--compare', help='The results of a previous run to compare with.')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='The relative slowdown reported as a regression in the comparison.')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='The benchmarks to run.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--chain-sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--difficulties', type=int, nargs='+', default=[1, 2, 3, 4])
+    parser.add_argument('--blocks-per-difficulty', type=int, default=5)
+    parser.add_argument('--mining-workers', type=int, default=1)
+    parser.add_argument('--storage-blocks', type=int, default=1000)
+    options = parser.parse_args()
+
+    results = {'commit': current_commit(), 'python': python_version(), 'timestamp': time(), 'results': {}}
+    with TemporaryDirectory(prefix='jiocoin-bench-') as directory:
+        for name in options.only or BENCHMARKS:
+            for benchmark, result in BENCHMARKS[name](options, directory).items():
+                results['results'][benchmark] = result
+                extra = ''
+                if 'hashes_per_second' in result:
+                    extra = f' ({result["hashes_per_second"]:,.0f} hashes/s)'
+                elif 'bytes_per_transaction' in result:
+                    extra = f' ({result["bytes_per_transaction"]:,.0f} bytes per transaction)'
+                print(f'{benchmark:40} {result["seconds"] * 1e3:12.4f} ms{extra}')
+
+    with open(options.output, 'w') as file_out:
+        dump(results, file_out, indent=2)
+
+    if options.compare:
+        with open(options.compare) as file_in:
+            baseline = load(file_in)
+        if compare(results, baseline, options.threshold):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,155 @@
+from helper import LRUCache, ordered_dict
+from merkle import merkle_root
+from transaction import TransactionColumns
+
+HEADER_FIELDS = ('index', 'previous_hash', 'nonce', 'timestamp', 'merkle_root')
+
+
 class Block:
     """
     Initializes the instance attributes of a block  and returns the block as a string.
+    The Merkle root of the transactions is computed if it is not given.
+    The hash computed from the block header is cached outside the block attributes, and the cache is cleared
+    whenever a header attribute changes.
+    The transactions of a block are kept outside the block attributes too. They can be unloaded once the block
+    is saved, and are then loaded again from the storage on access.
+    The attributes are kept in slots, without a per-block dictionary.
     """
-    def __init__(self, index, previous_hash, timestamp, transactions, block_hash=None, nonce=0):
+    __slots__ = ('index', 'hash', 'previous_hash', 'nonce', 'timestamp', 'merkle_root', 'header_hash', 'body', 'loader')
+
+    def __init__(self, index, previous_hash, timestamp, transactions, block_hash=None, nonce=0, root=None):
+        self.header_hash = None
+        self.loader = None
         self.index = index
         self.hash = block_hash
         self.previous_hash = previous_hash
         self.nonce = nonce
         self.timestamp = timestamp
+        self.merkle_root = root if root is not None else merkle_root(transactions)
         self.transactions = transactions
 
+    def __setattr__(self, name, value):
+        """
+        Sets an attribute of the block and clears the cached header hash if the attribute is part of the header.
+        :param name: The name of the attribute.
+        :param value: The value of the attribute.
+        :return: None.
+        """
+        if name in HEADER_FIELDS:
+            object.__setattr__(self, 'header_hash', None)
+        object.__setattr__(self, name, value)
+
+    @property
+    def transactions(self):
+        """
+        Gets the transactions of the block, from the storage if they are unloaded.
+        :return: list of ordered dictionary - the transactions of the block.
+        """
+        if self.body is None and self.loader is not None:
+            return self.loader.load(self)
+        return self.body
+
+    @transactions.setter
+    def transactions(self, transactions):
+        self.body = transactions
+
+    def header(self):
+        """
+        Gets the block header, which is covered by the hash of the block.
+        :return: dictionary - the header attributes.
+        """
+        return {'index': self.index,
+                'previous_hash': self.previous_hash,
+                'nonce': self.nonce,
+                'timestamp': self.timestamp,
+                'merkle_root': self.merkle_root}
+
+    def to_dict(self, with_transactions=True):
+        """
+        Converts the block to a dictionary.
+        :param with_transactions: Determines whether to include the transactions of the block.
+        :return: dictionary - the block attributes.
+        """
+        block = {'index': self.index,
+                 'hash': self.hash,
+                 'previous_hash': self.previous_hash,
+                 'nonce': self.nonce,
+                 'timestamp': self.timestamp,
+                 'merkle_root': self.merkle_root}
+        if with_transactions:
+            block['transactions'] = [dict(transaction) for transaction in self.transactions]
+        return block
+
+    @staticmethod
+    def from_dict(block):
+        """
+        Creates a block from its dictionary received from a peer node. Its transactions are converted to
+        the canonical form of ordered_dict.
+        :param block: The block as a dictionary.
+        :return: Block object
+        :raises TypeError, ValueError: if a transaction has an invalid amount or signature.
+        """
+        return Block(block['index'],
+                     block['previous_hash'],
+                     block['timestamp'],
+                     ordered_dict(block['transactions']),
+                     block['hash'],
+                     block['nonce'],
+                     block.get('merkle_root'))
+
     def __repr__(self):
         """
         Returns a dictionary of the Block object's attributes in the string format
         :return: string - block attributes
         """
-        return str(self.__dict__)
+        return str(self.to_dict())
+
+
+class BlockBodies:
+    """
+    Loads the transactions of the blocks whose bodies are unloaded from the storage of the node.
+    The most recently used bodies are kept in a bounded LRU cache, so that the memory used by the transactions
+    does not grow with the length of the chain. The cached bodies are kept in columnar transaction stores unless
+    columnar is False.
+    """
+    def __init__(self, fetch, max_size=256, columnar=True):
+        self.fetch = fetch
+        self.cache = LRUCache(max_size)
+        self.columnar = columnar
+
+    def compact(self, transactions):
+        """
+        Converts the transactions of a block to the representation kept in the cache.
+        :param transactions: The transactions of the block.
+        :return: TransactionColumns object, or the transactions as they are if the bodies are not columnar.
+        """
+        if self.columnar and not isinstance(transactions, TransactionColumns):
+            return TransactionColumns(transactions)
+        return transactions
+
+    def load(self, block):
+        """
+        Gets the transactions of a block, from the cache or from the storage.
+        :param block: The block whose transactions are unloaded.
+        :return: list of ordered dictionary - the transactions of the block.
+        :raises LookupError: if the block is no longer in the storage.
+        """
+        transactions = self.cache.get(block.hash)
+        if transactions is None:
+            stored = self.fetch(block.index)
+            if stored is None or stored.hash != block.hash:
+                raise LookupError(f'The body of block {block.index} is no longer stored')
+            transactions = self.compact(stored.transactions)
+            self.cache.put(block.hash, transactions)
+        return transactions
+
+    def unload(self, block):
+        """
+        Drops the transactions of a saved block from memory. They stay in the cache until they are discarded.
+        :param block: The block saved to the storage.
+        :return: None.
+        """
+        if block.body is not None:
+            self.cache.put(block.hash, self.compact(block.body))
+            block.body = None
+        block.loader = self
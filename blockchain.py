@@ -1,14 +1,22 @@
-from time import time
-from json import dumps, loads
-import requests
+from time import perf_counter, time
+from requests.exceptions import RequestException
 
-from transaction import Transaction
-from block import Block
+from transaction import Transaction, transaction_id
+from block import Block, BlockBodies
+from broadcast import Broadcaster
+from codec import BLOCK_MIMETYPE, decode_block, encode_block
 from helper import hash_block_data, ordered_dict
+from ledger import Ledger
+from mempool import Mempool
+from merkle import merkle_root
+from metrics import CHAIN_HEIGHT, LOAD_SECONDS, MEMPOOL_SIZE, SAVE_SECONDS, record_mining
+from miner import mine
+from snapshot import SNAPSHOT_INTERVAL, SNAPSHOTS_KEPT, Snapshot
 from sql_util import Table
 from wallet import Wallet
 
 MINING_REWARD = 10.0
+MINING_SENDER = 'Jiocoin'
 
 
 class Blockchain:
@@ -16,13 +24,33 @@ class Blockchain:
     Verifies and creates the chain of blocks and list of open transactions.
     """
 
-    def __init__(self, host, mysql, conn, difficulty=4):
+    def __init__(self, host, mysql, node_db, difficulty=4, mining_workers=None, broadcaster=None,
+                 mempool_size=10000, block_store=None, body_cache_size=256, columnar_bodies=True,
+                 snapshot_interval=SNAPSHOT_INTERVAL, snapshots_kept=SNAPSHOTS_KEPT, trusted_snapshot=None):
         self.difficulty = difficulty
+        self.mining_workers = mining_workers
+        self.mining_attempts = 0
+        self.broadcaster = broadcaster or Broadcaster()
         self.host = host
         self.mysql = mysql
-        self.conn = conn
+        self.node_db = node_db
+        self.block_store = block_store
+        self.bodies = BlockBodies(self.fetch_block, body_cache_size, columnar_bodies)
         self.chain = []
-        self.open_transactions = []
+        self.mempool_size = mempool_size
+        self.open_transactions = Mempool(max_size=mempool_size)
+        self.saved_hashes = []
+        self.saved_open_transactions = {}
+        self.tx_heights = {}
+        self.ledger = Ledger()
+        self.validated_height = 0
+        self.validated_hash = None
+        self.saved_checkpoint = (0, None)
+        self.snapshot_interval = snapshot_interval
+        self.snapshots_kept = snapshots_kept
+        self.trusted_snapshot = trusted_snapshot
+        self.snapshot_heights = []
+        self.saved_balances_tip = (0, None)
         self.load_data()
 
     def __repr__(self):
@@ -34,27 +62,13 @@ class Blockchain:
 
     def calculate_balance(self):
         """
-        Calculates the balance of the host or user account.
+        Calculates the balance of the host or user account from the confirmed balance in the ledger
+        and the amounts sent in the open transactions.
         :return: float - balance of the host or user account.
         """
-        balance = 0
-        for block in self.chain:
-            for transaction in (block.__dict__['transactions']):
-                if transaction['recipient'] == self.host:
-                    balance += transaction['amount']
-                elif transaction['sender'] == self.host:
-                    balance -= transaction['amount']
-                else:
-                    continue
-
-        for transaction in self.open_transactions:
-            if transaction['sender'] == self.host:
-                balance -= transaction['amount']
-            else:
-                continue
-        return balance
+        return self.ledger.balance(self.host) - self.open_transactions.outgoing_amount(self.host)
 
-    def add_transactions(self, sender, recipient, amount, signature, node_list=None, broadcast=False):
+    def add_transactions(self, sender, recipient, amount, signature, node_list=None, broadcast=False, nonce=0):
         """
         Creates a new transaction, validates the signature of the transaction and
         adds the transaction to the open transactions list.
@@ -64,68 +78,146 @@ class Blockchain:
         :param signature: The signature of the transaction.
         :param node_list: The list of nodes to which the transaction should broadcast.
         :param broadcast: Determines whether to broadcast or not.
+        :param nonce: The nonce of the transaction.
         :return: boolean - True: if the transaction is successfully added to the open transactions list.
-                           False: if the validation of the transaction signature fails.
-        """
-        transaction = Transaction(len(self.open_transactions) + 1, sender, recipient, amount, signature)
-        if Wallet.verify_signature(transaction.__dict__, self.mysql):
-            self.open_transactions.append(transaction.__dict__)
-            self.save_data()
-            if broadcast:
-                tnx_dict = transaction.__dict__.copy()
-                for node in node_list:
-                    url = f'{node}/broadcast-tnx'
-                    try:
-                        response = requests.post(url, json={'transaction': tnx_dict, 'node': node})
-                        if response.status_code == 400 or response.status_code == 500:
-                            return False
-                    except requests.exceptions.ConnectionError:
-                        continue
-            return True
-        return False
+                           False: if the transaction is already known or the validation of the transaction
+                           signature fails.
+        """
+        transaction = self.admit_transaction(sender, recipient, amount, signature, nonce)
+        if transaction is None:
+            return False
+        if broadcast:
+            return self.broadcast_transaction(transaction, node_list)
+        return True
+
+    def admit_transaction(self, sender, recipient, amount, signature, nonce=0):
+        """
+        Creates a new transaction, validates the signature of the transaction and adds the transaction
+        to the open transactions list, without broadcasting it.
+        :param sender: The sender of the transaction.
+        :param recipient: The recipient of the transaction.
+        :param amount: The amount of the transaction.
+        :param signature: The signature of the transaction.
+        :param nonce: The nonce of the transaction.
+        :return: dictionary - the added transaction.
+                 None if the transaction has an invalid amount or signature, has a nonce, is already known or
+                 the validation of the transaction signature fails.
+        """
+        if nonce != 0:
+            return None
+        try:
+            transaction = Transaction(self.open_transactions.next_index(), sender, recipient, amount, signature, nonce)
+        except (TypeError, ValueError):
+            return None
+        if self.knows_transaction(transaction.id) or not Wallet.verify_signature(transaction.to_dict(), self.mysql):
+            return None
+        self.open_transactions.add(transaction.to_dict())
+        self.save_data()
+        return transaction.to_dict()
+
+    def broadcast_transaction(self, transaction, node_list):
+        """
+        Broadcasts a transaction added to the open transactions list to the peer nodes.
+        Only the transaction is used, so it is broadcast without the lock on the blockchain.
+        :param transaction: The transaction as a dictionary.
+        :param node_list: The list of nodes to which the transaction should broadcast.
+        :return: boolean - True: if no peer node rejected the transaction.
+                           False: if a peer node rejected it or failed.
+        """
+        results = self.broadcaster.post_all(node_list,
+                                            '/broadcast-tnx',
+                                            lambda node: {'transaction': transaction, 'node': node})
+        return not any(status == 400 or status == 500 for status in results.values())
 
     def mine_block(self, node_list):
         """
         Verifies the transactions in the open transactions list, creates a new block
         and adds the block to the blockchain.
+        The node serves its requests through ChainState.mine instead, which runs the same steps but searches
+        the nonce and broadcasts the block without holding the lock on the blockchain.
         :param node_list: The list of nodes to which the transaction should broadcast.
-        :return: None.
+        :return: boolean - True: if at least half of the peer nodes rejected the block as out of sync.
+                           False: otherwise.
+        """
+        block = self.prepare_block()
+        self.search_nonce(block)
+        data = encode_block(block)
+        self.append_mined_block(block)
+        return self.broadcast_mined_block(data, node_list)
+
+    def prepare_block(self):
+        """
+        Verifies the transactions in the open transactions list, deletes the ones with an invalid signature, and
+        creates the block to be mined on the tip of the chain with the open transactions and the mining reward.
+        :return: Block object with no nonce found yet.
         """
         try:
-            previous_hash = self.chain[-1].__dict__['hash']
+            previous_hash = self.chain[-1].hash
         except IndexError:
             previous_hash = '0' * 62 + 'x0'
-        for transaction in self.open_transactions:
-            if not Wallet.verify_signature(transaction, self.mysql):
+        open_transactions = list(self.open_transactions)
+        results = Wallet.verify_signatures(open_transactions, self.mysql)
+        for transaction, valid in zip(open_transactions, results):
+            if not valid:
                 self.delete_invalid_open_transaction(transaction)
-        self.open_transactions.append(Transaction(len(self.open_transactions) + 1,
-                                                  'Jiocoin',
-                                                  self.host,
-                                                  MINING_REWARD,
-                                                  '').__dict__)
-        transactions = ordered_dict(self.open_transactions[:])
-        block = Block(len(self.chain) + 1, previous_hash, str(time()), transactions)
-        while not hash_block_data(block)[:self.difficulty] == '0' * self.difficulty:
-            block.nonce += 1
-            block.timestamp = str(time())
-        else:
-            block.hash = hash_block_data(block)
-            self.chain.append(block)
-            self.open_transactions = []
-            self.save_data()
-            block = block.__dict__.copy()
-            block['transactions'] = transactions
-            count = 0
-            for node in node_list:
-                url = f'{node}/broadcast-block'
-                try:
-                    response = requests.post(url, json={'block': block, 'node': node})
-                    if response.status_code == 409:
-                        count += 1
-                except requests.exceptions.ConnectionError:
-                    continue
-            if count >= len(node_list)/2:
-                return True
+        reward = Transaction(self.open_transactions.next_index(),
+                             MINING_SENDER,
+                             self.host,
+                             MINING_REWARD,
+                             '',
+                             len(self.chain) + 1)
+        transactions = ordered_dict(list(self.open_transactions) + [reward.to_dict()])
+        return Block(len(self.chain) + 1, previous_hash, str(time()), transactions)
+
+    def search_nonce(self, block):
+        """
+        Searches the nonce of a block prepared for mining and sets its nonce, timestamp and hash.
+        Only the block is used, so the search runs without the lock on the blockchain.
+        :param block: The block returned by prepare_block.
+        :return: None.
+        """
+        start = perf_counter()
+        nonce, timestamp, block_hash, self.mining_attempts = mine(block, self.difficulty, self.mining_workers)
+        record_mining(self.mining_attempts, perf_counter() - start)
+        block.nonce = nonce
+        block.timestamp = timestamp
+        block.hash = block_hash
+
+    def append_mined_block(self, block):
+        """
+        Appends a mined block to the chain, if the chain has not changed since the block was prepared, and removes
+        its transactions from the open transactions.
+        :param block: The mined block.
+        :return: boolean - True: if the block is appended.
+                           False: if a block was added to the chain or the chain was replaced while mining.
+        """
+        tip_hash = self.chain[-1].hash if self.chain else '0' * 62 + 'x0'
+        if block.index != len(self.chain) + 1 or block.previous_hash != tip_hash:
+            return False
+        self.chain.append(block)
+        self.advance_checkpoint()
+        self.ledger.apply_block(block)
+        for transaction in block.transactions:
+            self.open_transactions.remove_transaction(transaction)
+        self.save_data()
+        return True
+
+    def broadcast_mined_block(self, data, node_list):
+        """
+        Broadcasts a mined block to the peer nodes.
+        :param data: The block in the compact binary encoding.
+        :param node_list: The list of nodes to which the block should broadcast.
+        :return: boolean - True: if at least half of the peer nodes rejected the block as out of sync.
+                           False: otherwise.
+        """
+        results = self.broadcaster.post_all(node_list,
+                                            '/broadcast-block',
+                                            lambda node: {'node': node},
+                                            data,
+                                            BLOCK_MIMETYPE)
+        count = sum(1 for status in results.values() if status == 409)
+        if count >= len(node_list)/2:
+            return True
 
         return False
 
@@ -136,92 +228,321 @@ class Blockchain:
         :return boolean - True: if the block is successfully added to the local chain.
                           False: if the block fails.
         """
-        block_obj = Block(block['index'],
-                          block['previous_hash'],
-                          block['timestamp'],
-                          block['transactions'],
-                          block['hash'],
-                          block['nonce'])
+        try:
+            block_obj = Block.from_dict(block)
+        except (TypeError, ValueError):
+            return False
         if block['index'] == 1:
             if not self.is_valid_block(block_obj):
                 return False
         else:
             if not self.is_valid_block(block_obj, self.chain[- 1]):
                 return False
+        if not self.has_valid_signatures(block_obj.transactions) or \
+                not self.has_unique_transactions(block_obj.transactions) or \
+                self.has_confirmed_transactions(block_obj.transactions, len(self.chain)):
+            return False
         self.chain.append(block_obj)
+        self.advance_checkpoint()
+        self.ledger.apply_block(block_obj)
         for in_tnx in block['transactions']:
-            for tnx in self.open_transactions:
-                if tnx['index'] == in_tnx['index'] \
-                        and tnx['sender'] == in_tnx['sender'] \
-                        and tnx['recipient'] == in_tnx['recipient'] \
-                        and tnx['amount'] == in_tnx['amount'] \
-                        and tnx['signature'] == in_tnx['signature']:
-                    try:
-                        self.open_transactions.remove(tnx)
-                    except ValueError:
-                        print('Item was already removed')
+            self.open_transactions.remove_transaction(in_tnx)
         self.save_data()
         return True
 
     def resolve(self, node_list):
         """
-        Checks all peer nodes' blockchains and replaces the local one with longer valid ones.
+        Checks all peer nodes' blockchains and replaces the local one with the longest valid one.
+        The node serves its requests through ChainState.resolve instead, which runs the same steps but fetches
+        and validates the peer chains without holding the lock on the blockchain.
+        :param node_list: The list of peer nodes.
+        :return: boolean - True: if the local chain is replaced.
+                           False: otherwise.
         """
-        updated = False
+        candidate = self.fetch_longest_chain(node_list, self.chain[:], self.validated_length())
+        return candidate is not None and self.replace_chain(*candidate)
+
+    def fetch_longest_chain(self, node_list, chain, validated_length):
+        """
+        Fetches the longest valid chain of the peer nodes which is longer than a copy of the local chain.
+        Only the tip of each peer chain is fetched first. If the peer chain is longer, the fork point is found with
+        a block locator, and only the blocks after the fork point are fetched and validated. A peer reporting a fork
+        point above the local tip, or sending blocks which do not follow the fork point, is skipped.
+        If the operator pinned the digest of a trusted snapshot and the node shares no block with the peer,
+        the snapshot with that digest is fetched from the peer too. The proof of work and the links of all the blocks
+        are still checked, but the signatures of the transactions up to the snapshot are not, and the balances are
+        restored from the snapshot instead of being replayed from the first block.
+        Only the copy of the chain is used, so the peer chains are fetched and validated without the lock
+        on the blockchain.
+        :param node_list: The list of peer nodes.
+        :param chain: The copy of the local chain.
+        :param validated_length: The number of blocks at the beginning of the copy which are already validated.
+        :return: tuple - the longest peer chain and the trusted snapshot it starts from, or None.
+                 None if no peer chain is longer and valid.
+        """
+        candidate = None
         for node in node_list:
-            url = f'{node}/chain'
             try:
-                response = requests.get(url, json={'node': node})
-                node_chain = response.json()
-
-                node_chain = [Block(block['index'],
-                                    block['previous_hash'],
-                                    block['timestamp'],
-                                    ordered_dict(block['transactions']),
-                                    block['hash'],
-                                    block['nonce'])
-                              for block in node_chain]
-                node_chain_length = len(node_chain)
-                local_chain_length = len(self.chain)
-                if node_chain_length > local_chain_length and self.is_valid_chain(node_chain, False):
-                    self.chain = node_chain
-                    updated = True
-            except requests.exceptions.ConnectionError:
+                tip = self.broadcaster.request('GET', node, '/tip', {'node': node})
+                if tip['height'] <= len(chain):
+                    continue
+
+                located = self.broadcaster.request('POST', node, '/locate',
+                                                   {'node': node, 'locator': self.block_locator(chain)})
+                fork_height = int(located['height'])
+                if not 0 <= fork_height <= len(chain):
+                    continue
+                node_blocks = self.broadcaster.stream_frames(node, '/chain',
+                                                             {'from': fork_height + 1, 'format': 'binary'})
+                node_blocks = [decode_block(block) for block in node_blocks]
+                if not node_blocks or node_blocks[0].index != fork_height + 1 or \
+                        fork_height and node_blocks[0].previous_hash != chain[fork_height - 1].hash:
+                    continue
+                if self.has_confirmed_transactions((transaction for block in node_blocks
+                                                    for transaction in block.transactions), fork_height):
+                    continue
+
+                node_chain = chain[:fork_height] + node_blocks
+                start = min(fork_height, validated_length)
+                snapshot = None
+                if fork_height == 0 and self.trusted_snapshot is not None:
+                    snapshot = self.fetch_snapshot(node, self.trusted_snapshot)
+                    if snapshot is not None and (snapshot.digest != self.trusted_snapshot or
+                                                 not snapshot.matches(node_chain)):
+                        snapshot = None
+                signatures_from = snapshot.height if snapshot is not None else None
+                if len(node_chain) > len(chain) and \
+                        self.is_valid_chain(node_chain, False, start, signatures_from):
+                    chain = node_chain
+                    validated_length = len(chain)
+                    candidate = (node_chain, snapshot)
+            except (RequestException, KeyError, TypeError, ValueError, LookupError):
                 continue
+        return candidate
 
-        if updated:
-            self.open_transactions = []
-            self.save_data()
-        return updated
+    def replace_chain(self, node_chain, snapshot=None):
+        """
+        Replaces the local chain with a longer valid peer chain returned by fetch_longest_chain, and updates the
+        balances, from the trusted snapshot the peer chain starts from if there is one.
+        The local chain may have changed since the peer chain was fetched, so it is compared with the peer chain
+        again, and the transactions of the new blocks are checked again against the confirmed ones.
+        :param node_chain: The peer chain.
+        :param snapshot: The trusted snapshot the peer chain starts from, if any.
+        :return: boolean - True: if the local chain is replaced.
+                           False: if the local chain is no longer shorter, or the peer chain confirms a transaction
+                           again.
+        """
+        if len(node_chain) <= len(self.chain):
+            return False
+        fork_height = len(self.chain)
+        while fork_height > 0 and self.chain[fork_height - 1].hash != node_chain[fork_height - 1].hash:
+            fork_height -= 1
+        if self.has_confirmed_transactions((transaction for block in node_chain[fork_height:]
+                                            for transaction in block.transactions), fork_height):
+            return False
 
-    def is_valid_chain(self, peer_chain=None, validate_local=True):
+        if snapshot is not None:
+            self.ledger.restore(snapshot.balances, node_chain[snapshot.height:])
+        else:
+            self.ledger.switch_chain(self.chain, node_chain)
+        self.chain = node_chain
+        self.set_checkpoint()
+        self.open_transactions.clear()
+        self.save_data()
+        return True
+
+    def block_locator(self, chain=None):
+        """
+        Creates a block locator of the local chain: the heights and hashes of the last ten blocks, then of blocks
+        exponentially further apart down to the first block.
+        :param chain: The copy of the local chain to be used instead of the local chain.
+        :return: list of lists - the height and hash of each block of the locator, from the tip downwards.
+        """
+        chain = self.chain if chain is None else chain
+        locator = []
+        height = len(chain)
+        step = 1
+        while height > 0:
+            locator.append([height, chain[height - 1].hash])
+            if len(locator) >= 10:
+                step *= 2
+            height -= step
+        if locator and locator[-1][0] != 1:
+            locator.append([1, chain[0].hash])
+        return locator
+
+    def locate(self, locator):
+        """
+        Finds the highest block of a peer's block locator which is also in the local chain.
+        :param locator: The heights and hashes of the blocks of the peer chain, from the tip downwards.
+        :return: int - the height of the highest common block, 0 if there is none.
         """
-        Checks the validity of the blockchain.
+        for height, block_hash in locator:
+            if 1 <= height <= len(self.chain) and self.chain[height - 1].hash == block_hash:
+                return height
+        return 0
+
+    def is_valid_chain(self, peer_chain=None, validate_local=True, start=None, signatures_from=None):
+        """
+        Checks the validity of the blockchain, including the signatures of all its transactions.
+        The validation stops at the first invalid block. The local chain is validated from the validated checkpoint,
+        which is moved to the tip if the chain is valid.
+        :param peer_chain: The peer chain to be validated instead of the local chain.
+        :param validate_local: Determines whether to validate the local chain or the peer chain.
+        :param start: The number of blocks at the beginning of the chain which are already validated.
+        :param signatures_from: The number of blocks at the beginning of the chain whose transactions are covered
+        by a trusted snapshot. Only their proof of work, links and Merkle roots are checked.
         :return: boolean - True: if all the blocks in the blockchain are valid.
                  False: if any of the block in the blockchain is corrupted.
         """
-        valid_list = []
         if validate_local:
             chain_to_be_validated = self.chain
+            start = self.validated_length() if start is None else start
         else:
             chain_to_be_validated = peer_chain
+            start = 0 if start is None else start
 
-        for count, block in enumerate(chain_to_be_validated):
+        for count in range(start, len(chain_to_be_validated)):
+            block = chain_to_be_validated[count]
             if count == 0:
-                valid_list.append(self.is_valid_block(block))
-            else:
-                valid_list.append(self.is_valid_block(block, chain_to_be_validated[count - 1]))
+                if not self.is_valid_block(block):
+                    return False
+            elif not self.is_valid_block(block, chain_to_be_validated[count - 1]):
+                return False
 
-        if all(valid_list):
-            return True
+        signatures_from = start if signatures_from is None else max(start, signatures_from)
+        transactions = [transaction for block in chain_to_be_validated[signatures_from:]
+                        for transaction in block.transactions]
+        if not self.has_unique_transactions(transactions) or not self.has_valid_signatures(transactions):
+            return False
+        if validate_local:
+            self.set_checkpoint()
+        return True
+
+    def validated_length(self):
+        """
+        Gets the number of blocks at the beginning of the local chain which are already validated.
+        :return: int - the height of the validated checkpoint if the block at that height still has the
+                 checkpoint hash, otherwise 0.
+        """
+        if 0 < self.validated_height <= len(self.chain) and \
+                self.chain[self.validated_height - 1].hash == self.validated_hash:
+            return self.validated_height
+        return 0
+
+    def set_checkpoint(self):
+        """
+        Moves the validated checkpoint to the tip of the local chain.
+        :return: None.
+        """
+        self.validated_height = len(self.chain)
+        self.validated_hash = self.chain[-1].hash if self.chain else None
+
+    def advance_checkpoint(self):
+        """
+        Moves the validated checkpoint to a block appended to the local chain after being validated against
+        the previous block, if the previous block is validated too.
+        :return: None.
+        """
+        if self.validated_length() == len(self.chain) - 1:
+            self.set_checkpoint()
+
+    def has_unique_transactions(self, transactions):
+        """
+        Checks that no transaction appears twice in a list of transactions.
+        :param transactions: A list of dictionary object transactions.
+        :return: boolean - True: if the IDs of the transactions are unique.
+                           False: if any of the transactions is repeated.
+        """
+        tnx_ids = [transaction_id(transaction) for transaction in transactions]
+        return len(set(tnx_ids)) == len(tnx_ids)
+
+    def has_unsigned_nonces(self, transactions):
+        """
+        Checks whether any signed transaction has a nonce. The nonce is part of the transaction ID but is not
+        signed, so a transaction with a nonce could be a confirmed transaction replayed under a new ID.
+        Only the mining rewards, which are not signed, use the nonce to keep their IDs unique.
+        :param transactions: A list of dictionary object transactions.
+        :return: boolean - True: if a transaction other than a mining reward has a nonce.
+                           False: if none of them has.
+        """
+        return any(transaction.get('nonce', 0) != 0 for transaction in transactions
+                   if transaction['sender'] != MINING_SENDER)
+
+    def find_block_of_transaction(self, tnx_id):
+        """
+        Finds the block of the local chain in which a transaction is confirmed, from the index of the confirmed
+        transactions kept in memory along with the transactions table.
+        :param tnx_id: The ID of the transaction.
+        :return: int - the index of the block, None if the transaction is not confirmed.
+        """
+        block_index = self.tx_heights.get(tnx_id)
+        if block_index is None or block_index > len(self.chain):
+            return None
+        return block_index
+
+    def has_confirmed_transactions(self, transactions, height):
+        """
+        Checks whether any of the transactions is already confirmed in the first blocks of the local chain.
+        :param transactions: A list of dictionary object transactions.
+        :param height: The number of blocks at the beginning of the local chain to be checked.
+        :return: boolean - True: if a transaction is confirmed in one of these blocks.
+                           False: if none of them is.
+        """
+        for transaction in transactions:
+            block_index = self.tx_heights.get(transaction_id(transaction))
+            if block_index is not None and block_index <= height:
+                return True
         return False
 
+    def knows_transaction(self, tnx_id):
+        """
+        Checks whether a transaction is already open or confirmed, so that it is not added or relayed again.
+        :param tnx_id: The ID of the transaction.
+        :return: boolean - True: if the transaction is known.
+                           False: if the transaction is new.
+        """
+        return tnx_id in self.open_transactions or self.find_block_of_transaction(tnx_id) is not None
+
+    def find_transaction(self, tnx_id):
+        """
+        Looks up a transaction by its ID in the open transactions and in the blockchain.
+        :param tnx_id: The ID of the transaction.
+        :return: tuple - the transaction as a dictionary and the index of its block, which is None for an
+                 open transaction. None if the transaction is not found.
+        """
+        transaction = self.open_transactions.get(tnx_id)
+        if transaction is not None:
+            return transaction, None
+        block_index = self.find_block_of_transaction(tnx_id)
+        if block_index is None:
+            return None
+        for transaction in self.chain[block_index - 1].transactions:
+            if transaction_id(transaction) == tnx_id:
+                return dict(transaction), block_index
+        return None
+
+    def has_valid_signatures(self, transactions):
+        """
+        Checks the signatures of the transactions as a batch. The mining rewards are not signed and are skipped.
+        :param transactions: A list of dictionary object transactions.
+        :return: boolean - True: if all the signatures are valid.
+                           False: if any of the signatures is not valid.
+        """
+        signed_transactions = [transaction for transaction in transactions if transaction['sender'] != MINING_SENDER]
+        return all(Wallet.verify_signatures(signed_transactions, self.mysql))
+
     def is_valid_block(self, block, prev_block=None):
         """
-        Checks the validity of a block in the blockchain.
+        Checks the validity of a block in the blockchain, and that its Merkle root matches its transactions.
+        A block with a repeated transaction is rejected, since it can share the Merkle root of the block without
+        the repetition. A block with a signed transaction which has a nonce is rejected too.
         :return: boolean - True: if a block in the blockchain is valid.
                            False: if a block in the blockchain is corrupted.
         """
+        if not self.has_unique_transactions(block.transactions) or self.has_unsigned_nonces(block.transactions) or \
+                block.merkle_root != merkle_root(block.transactions):
+            return False
         if prev_block is None:
             if hash_block_data(block)[:self.difficulty] != '0' * self.difficulty:
                 return False
@@ -230,92 +551,323 @@ class Blockchain:
             return False
         return True
 
+    @LOAD_SECONDS.time()
     def load_data(self):
         """
-        Loads the blockchain and open transactions from the MySQL database.
+        Loads the blockchain, open transactions, balances and validated checkpoint from the database.
+        The blockchain is read from the block store instead if the node has one. The blocks appended to the store by
+        a save whose database transaction was not committed are removed first, and the blocks of the blockchain
+        table are moved to the store if the node has just switched to a block store.
+        Only the block headers are loaded, from the header columns of the blockchain table, and the transactions
+        of the blocks are loaded when they are accessed.
+        The saved balances belong to the block at which they were saved, so only the blocks after it are replayed.
+        The balances are restored from the latest snapshot if they have not been saved or do not belong to the chain,
+        and are reset if the chain is empty.
         :return: None.
         """
-        blockchain = []
-        blockchain_db = Table("blockchain", self.conn,
-                              ("id", "INT", 100, ""),
-                              ("hash", "VARCHAR", 100, "UNIQUE"),
-                              ("previous_hash", "VARCHAR", 100, "UNIQUE"),
-                              ("nonce", "INT", 10, ""),
-                              ("timestamp", "VARCHAR", 20, ""),
-                              ("transactions", "JSON", "", ""))
-        for row in blockchain_db.get_all_data():
-            block = Block(row['id'],
-                          row['previous_hash'],
-                          row['timestamp'],
-                          loads(row['transactions']),
-                          row['hash'],
-                          row['nonce'])
-            blockchain.append(block)
-            self.chain = blockchain
+        meta_db = Table("meta", self.node_db)
+        meta = {row['name']: row['value'] for row in meta_db.get_all_data() if row['value'] not in (None, 'None')}
+
+        if self.block_store is not None:
+            chain_height = self.move_blocks_to_store()
+            if chain_height is None:
+                chain_height = int(meta.get('chain_height', 0))
+            self.block_store.truncate(chain_height)
+            self.chain = list(self.block_store.headers())
+        else:
+            blockchain = []
+            blockchain_db = Table("blockchain", self.node_db)
+            for row in blockchain_db.get_columns('id', 'hash', 'previous_hash', 'nonce', 'timestamp', 'merkle_root'):
+                blockchain.append(Block(row['id'],
+                                        row['previous_hash'],
+                                        row['timestamp'],
+                                        None,
+                                        row['hash'],
+                                        row['nonce'],
+                                        row['merkle_root']))
+                self.chain = blockchain
+        for block in self.chain:
+            self.bodies.unload(block)
+
+        transactions_db = Table("transactions", self.node_db)
+        self.tx_heights = {row['tx_id']: row['block'] for row in transactions_db.get_all_data()}
 
         transactions = []
-        open_transactions_db = Table("open_transactions", self.conn,
-                                     ("id", "INT", 100, ""),
-                                     ("sender", "VARCHAR", 50, ""),
-                                     ("recipient", "VARCHAR", 50, ""),
-                                     ("amount", "FLOAT", 20, ""),
-                                     ("signature", "VARCHAR", 2048, ""))
+        open_transactions_db = Table("open_transactions", self.node_db)
         for tnx in open_transactions_db.get_all_data():
             transaction = Transaction(tnx['id'],
                                       tnx['sender'],
                                       tnx['recipient'],
                                       tnx['amount'],
-                                      tnx['signature'])
-            transactions.append(transaction.__dict__)
-        self.open_transactions = transactions
+                                      tnx['signature'],
+                                      tnx['nonce'])
+            transactions.append(transaction.to_dict())
+        self.open_transactions = Mempool(transactions, self.mempool_size)
+
+        self.saved_hashes = [block.hash for block in self.chain]
+        self.saved_open_transactions = self.open_transactions.transactions.copy()
 
+        self.validated_height = int(meta.get('validated_height', 0))
+        self.validated_hash = meta.get('validated_hash')
+        self.saved_checkpoint = (self.validated_height, self.validated_hash)
+
+        snapshots_db = Table("snapshots", self.node_db)
+        self.snapshot_heights = sorted(row['id'] for row in snapshots_db.get_one_column('id'))
+
+        balances_db = Table("balances", self.node_db)
+        self.ledger = Ledger({row['address']: row['balance'] for row in balances_db.get_all_data()})
+        if 'balances_height' in meta:
+            self.saved_balances_tip = (int(meta['balances_height']), meta.get('balances_hash'))
+        else:
+            self.saved_balances_tip = self.tip()
+        height, tip_hash = self.saved_balances_tip
+        if self.ledger.balances and (height, tip_hash) == self.tip(height):
+            for block in self.chain[height:]:
+                self.ledger.apply_block(block)
+            if height < len(self.chain):
+                self.save_data()
+        elif self.chain or self.ledger.balances:
+            self.rebuild_balances()
+        self.update_gauges()
+
+    def move_blocks_to_store(self):
+        """
+        Moves the blocks of the blockchain table to the block store, when a node which kept its blocks in the table
+        is started with a block store. The store is replaced by the blocks of the table, and the table is emptied
+        in the database transaction which records the height of the chain, so that the move is done again
+        if it is interrupted.
+        :return: int - the number of blocks moved, None if the blockchain table is empty.
+        """
+        blockchain_db = Table("blockchain", self.node_db)
+        rows = sorted(blockchain_db.get_all_data(), key=lambda row: row['id'])
+        if not rows:
+            return None
+        self.block_store.truncate(0)
+        for row in rows:
+            self.block_store.append(decode_block(row['body']))
+        meta_db = Table("meta", self.node_db)
+        with self.node_db.transaction():
+            meta_db.upsert_data('chain_height', len(rows))
+            blockchain_db.delete_range('id', 1)
+        return len(rows)
+
+    @SAVE_SECONDS.time()
     def save_data(self):
         """
-        Saves the blockchain and open transactions to the MySQL database.
+        Saves the changes to the blockchain, open transactions, balances and validated checkpoint since the last load
+        or save to the database. Only the blocks after the prefix shared with the saved chain, the open
+        transactions added or removed, the balances changed and the moved checkpoint are written, and all the writes
+        are committed as a single database transaction. The blocks are appended to the block store instead of the
+        blockchain table if the node has one. The store is written before the database transaction, which records
+        the height of the chain, so that load_data drops the blocks of a save which was not committed.
+        The transactions of the saved blocks are then unloaded from memory, and the in-memory index of the confirmed
+        transactions is updated once the writes are committed.
+        A snapshot of the balances is saved every snapshot_interval blocks, and the snapshots of the blocks removed
+        from the chain are deleted.
         :return: None.
         """
-        blockchain_db = Table("blockchain", self.conn,
-                              ("id", "INT", 100, ""),
-                              ("hash", "VARCHAR", 100, "UNIQUE"),
-                              ("previous_hash", "VARCHAR", 100, "UNIQUE"),
-                              ("nonce", "INT", 10, ""),
-                              ("timestamp", "VARCHAR", 20, ""),
-                              ("transactions", "JSON", "", ""))
-        blockchain_db.delete_all_data()
-        for block in self.chain:
-            blockchain_db.insert_data(block.index,
-                                      block.hash,
-                                      block.previous_hash,
-                                      block.nonce,
-                                      block.timestamp,
-                                      dumps(block.transactions))
-
-        open_transactions_db = Table("open_transactions", self.conn,
-                                     ("id", "INT", 100, ""),
-                                     ("sender", "VARCHAR", 50, ""),
-                                     ("recipient", "VARCHAR", 50, ""),
-                                     ("amount", "FLOAT", 20, ""),
-                                     ("signature", "VARCHAR", 2048, ""))
-        open_transactions_db.delete_all_data()
-        for transaction in self.open_transactions:
-            open_transactions_db.insert_data(transaction['index'],
-                                             transaction['sender'],
-                                             transaction['recipient'],
-                                             transaction['amount'],
-                                             transaction['signature'])
+        blockchain_db = Table("blockchain", self.node_db)
+        open_transactions_db = Table("open_transactions", self.node_db)
+
+        common_length = min(len(self.saved_hashes), len(self.chain))
+        while common_length > 0 and self.saved_hashes[common_length - 1] != self.chain[common_length - 1].hash:
+            common_length -= 1
+
+        transactions_db = Table("transactions", self.node_db)
+        balances_db = Table("balances", self.node_db)
+        meta_db = Table("meta", self.node_db)
+        snapshots_db = Table("snapshots", self.node_db)
+
+        snapshot_heights = [height for height in self.snapshot_heights if height <= common_length]
+        snapshot = None
+        if self.snapshot_interval and len(self.chain) >= max(snapshot_heights, default=0) + self.snapshot_interval:
+            snapshot = Snapshot(*self.tip(), self.ledger.balances)
+            snapshot_heights.append(snapshot.height)
+
+        open_transactions = self.open_transactions.transactions.copy()
+        removed_keys = self.saved_open_transactions.keys() - open_transactions.keys()
+        added_keys = open_transactions.keys() - self.saved_open_transactions.keys()
+
+        if self.block_store is not None:
+            self.block_store.truncate(common_length)
+            for block in self.chain[common_length:]:
+                self.block_store.append(block)
+
+        confirmed = []
+        with self.node_db.transaction():
+            if common_length < len(self.saved_hashes):
+                if self.block_store is None:
+                    blockchain_db.delete_range('id', common_length + 1)
+                transactions_db.delete_range('block', common_length + 1)
+                snapshots_db.delete_range('id', common_length + 1)
+            if self.block_store is not None and common_length < max(len(self.saved_hashes), len(self.chain)):
+                meta_db.upsert_data('chain_height', len(self.chain))
+            for block in self.chain[common_length:]:
+                if self.block_store is None:
+                    blockchain_db.insert_data(block.index,
+                                              block.hash,
+                                              block.previous_hash,
+                                              block.nonce,
+                                              block.timestamp,
+                                              block.merkle_root,
+                                              encode_block(block))
+                for transaction in block.transactions:
+                    confirmed.append((transaction_id(transaction), block.index))
+                    transactions_db.upsert_data(confirmed[-1][0], block.index)
+
+            for key in removed_keys:
+                open_transactions_db.delete_one('tx_id', key)
+            for tnx_id, transaction in open_transactions.items():
+                if tnx_id in added_keys:
+                    open_transactions_db.insert_data(tnx_id,
+                                                     transaction['index'],
+                                                     transaction['sender'],
+                                                     transaction['recipient'],
+                                                     transaction['amount'],
+                                                     transaction['signature'],
+                                                     transaction['nonce'])
+
+            for address in self.ledger.changed:
+                balances_db.upsert_data(address, self.ledger.balance(address))
+
+            balances_tip = self.tip()
+            if balances_tip != self.saved_balances_tip:
+                meta_db.upsert_data('balances_height', balances_tip[0])
+                self.save_meta(meta_db, 'balances_hash', balances_tip[1])
+
+            checkpoint = (self.validated_height, self.validated_hash)
+            if checkpoint != self.saved_checkpoint:
+                meta_db.upsert_data('validated_height', self.validated_height)
+                self.save_meta(meta_db, 'validated_hash', self.validated_hash)
+
+            if snapshot is not None:
+                snapshots_db.insert_data(snapshot.height,
+                                         snapshot.tip_hash,
+                                         snapshot.digest,
+                                         snapshot.encode_balances())
+            for height in snapshot_heights[:-self.snapshots_kept]:
+                snapshots_db.delete_one('id', height)
+
+        if common_length < len(self.saved_hashes):
+            self.tx_heights = {tnx_id: block_index for tnx_id, block_index in self.tx_heights.items()
+                               if block_index <= common_length}
+        self.tx_heights.update(confirmed)
+        self.ledger.changed.clear()
+        self.saved_balances_tip = balances_tip
+        self.snapshot_heights = snapshot_heights[-self.snapshots_kept:]
+        self.saved_checkpoint = (self.validated_height, self.validated_hash)
+        del self.saved_hashes[common_length:]
+        self.saved_hashes.extend(block.hash for block in self.chain[common_length:])
+        for block in self.chain[common_length:]:
+            self.bodies.unload(block)
+        self.saved_open_transactions = open_transactions
+        self.update_gauges()
+
+    def update_gauges(self):
+        """
+        Updates the chain height and mempool size in the metrics.
+        :return: None.
+        """
+        CHAIN_HEIGHT.set(len(self.chain))
+        MEMPOOL_SIZE.set(len(self.open_transactions))
+
+    @staticmethod
+    def save_meta(meta_db, name, value):
+        """
+        Saves a value of the meta table. A None value is saved by deleting its row, so that it is read back
+        as missing instead of as a string.
+        :param meta_db: The meta table.
+        :param name: The name of the value.
+        :param value: The value, or None.
+        :return: None.
+        """
+        if value is None:
+            meta_db.delete_one('name', name)
+        else:
+            meta_db.upsert_data(name, value)
+
+    def fetch_block(self, height):
+        """
+        Reads a saved block with its transactions from the block store or the blockchain table.
+        :param height: The height of the block, starting from 1.
+        :return: Block object, None if no block is saved at that height.
+        """
+        if self.block_store is not None:
+            return self.block_store.get(height) if height <= len(self.block_store) else None
+        blockchain_db = Table("blockchain", self.node_db)
+        row = blockchain_db.get_one('id', height)
+        return decode_block(row['body']) if row is not None else None
+
+    def tip(self, height=None):
+        """
+        Gets the height and hash of a block of the local chain, the last block by default.
+        :param height: The height of the block, starting from 1. 0 for the empty chain.
+        :return: tuple - the height and hash of the block, with a None hash if the chain has no block at that height.
+        """
+        height = len(self.chain) if height is None else height
+        return height, self.chain[height - 1].hash if 0 < height <= len(self.chain) else None
+
+    def rebuild_balances(self):
+        """
+        Rebuilds the balances of all the addresses from the latest snapshot of the chain, by replaying only
+        the blocks after it, or from scratch by replaying the blockchain if there is no snapshot, and saves them
+        to the database.
+        :return: None.
+        """
+        snapshot = self.latest_snapshot()
+        if snapshot is not None:
+            self.ledger.restore(snapshot.balances, self.chain[snapshot.height:])
+        else:
+            self.ledger.rebuild(self.chain)
+        self.save_data()
+
+    def latest_snapshot(self, digest=None):
+        """
+        Reads the latest saved snapshot which belongs to the local chain and is not corrupted.
+        :param digest: The digest of the snapshot to be read, any snapshot by default.
+        :return: Snapshot object, None if there is no such snapshot.
+        """
+        snapshots_db = Table("snapshots", self.node_db)
+        for height in reversed(self.snapshot_heights):
+            row = snapshots_db.get_one('id', height)
+            if row is not None and (digest is None or row['digest'] == digest):
+                snapshot = Snapshot.from_row(row)
+                if snapshot.matches(self.chain) and snapshot.is_intact():
+                    return snapshot
+        return None
+
+    def verify_snapshot(self, snapshot=None):
+        """
+        Checks a snapshot against a full replay of the local chain up to its height.
+        :param snapshot: The snapshot to be checked, the latest saved snapshot by default.
+        :return: boolean - True: if the snapshot matches the replayed balances.
+                           False: if there is no snapshot or it does not match.
+        """
+        snapshot = snapshot or self.latest_snapshot()
+        return snapshot is not None and snapshot.verify(self.chain)
+
+    def fetch_snapshot(self, node, digest=None):
+        """
+        Fetches the latest snapshot of a peer node.
+        :param node: The address of the peer node.
+        :param digest: The digest of the snapshot to be fetched, the latest snapshot of the peer by default.
+        :return: Snapshot object, None if the peer has no snapshot or its snapshot is corrupted.
+        """
+        try:
+            snapshot = Snapshot.from_dict(self.broadcaster.request('GET', node, '/snapshot',
+                                                                   {'node': node, 'digest': digest}))
+        except (RequestException, KeyError, TypeError, ValueError):
+            return None
+        return snapshot if snapshot.is_intact() else None
 
     def delete_invalid_open_transaction(self, transaction):
         """
-        Deletes a transaction with invalid signature from the open transactions list and from the open_transactions
-        table in the MySQL database.
+        Deletes a transaction with invalid signature from the mempool and from the open_transactions
+        table in the database.
         :param transaction: The corrupted transaction with invalid signature.
         :return: None.
         """
-        self.open_transactions.remove(transaction)
-        open_transactions_db = Table("open_transactions", self.conn,
-                                     ("id", "INT", 100, ""),
-                                     ("sender", "VARCHAR", 50, ""),
-                                     ("recipient", "VARCHAR", 50, ""),
-                                     ("amount", "FLOAT", 20, ""),
-                                     ("signature", "VARCHAR", 2048, ""))
-        open_transactions_db.delete_one("signature", transaction['signature'])
+        self.open_transactions.remove_transaction(transaction)
+        open_transactions_db = Table("open_transactions", self.node_db)
+        open_transactions_db.delete_one("tx_id", transaction['id'])
+        self.saved_open_transactions.pop(transaction['id'], None)
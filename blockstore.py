@@ -0,0 +1,201 @@
+from binascii import hexlify, unhexlify
+from struct import Struct
+from threading import Lock
+import mmap
+import os
+
+from codec import LENGTH, decode_block, decode_header, encode_block, encode_frame
+
+INDEX_RECORD = Struct('<32sIQI')
+SEGMENT_SIZE = 64 * 1024 * 1024
+
+
+class BlockStore:
+    """
+    Stores the blocks of the chain in append-only segment files, in the compact binary encoding.
+    A small index file next to the segments keeps the hash, segment, offset and length of the block at each height,
+    so that a block is found without scanning the segments. The segments are read through memory maps, so that
+    the bytes of a block are read without copying them.
+    Removing the blocks after a height only shortens the index. Their bytes stay in the segments and the next blocks
+    are appended after them, so that the bytes already handed out by the memory maps are never overwritten.
+    """
+    def __init__(self, directory, segment_size=SEGMENT_SIZE, sync=False):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.sync = sync
+        self.lock = Lock()
+        self.locations = []
+        self.hashes = []
+        self.heights = {}
+        self.maps = {}
+        os.makedirs(directory, exist_ok=True)
+
+        self.index_file = open(os.path.join(directory, 'index.dat'), 'a+b')
+        self.index_file.seek(0)
+        index = self.index_file.read()
+        complete = len(index) - len(index) % INDEX_RECORD.size
+        for block_hash, segment, offset, length in INDEX_RECORD.iter_unpack(index[:complete]):
+            if offset + length > self.segment_length(segment):
+                break
+            self.locations.append((segment, offset, length))
+            self.hashes.append(hexlify(block_hash).decode('ascii'))
+            self.heights[self.hashes[-1]] = len(self.locations)
+        if len(self.locations) * INDEX_RECORD.size != len(index):
+            self.index_file.truncate(len(self.locations) * INDEX_RECORD.size)
+
+        self.segment = max(self.segment_numbers(), default=0)
+        self.segment_file = open(self.segment_path(self.segment), 'ab')
+
+    def __len__(self):
+        return len(self.locations)
+
+    def segment_path(self, segment):
+        """
+        Gets the path of a segment file.
+        :param segment: The number of the segment.
+        :return: string - the path of the segment file.
+        """
+        return os.path.join(self.directory, f'segment-{segment:05d}.dat')
+
+    def segment_numbers(self):
+        """
+        Lists the numbers of the segment files in the directory of the store.
+        :return: list of integers - the segment numbers.
+        """
+        return [int(name[8:13]) for name in os.listdir(self.directory)
+                if name.startswith('segment-') and name.endswith('.dat')]
+
+    def segment_length(self, segment):
+        """
+        Gets the size of a segment file.
+        :param segment: The number of the segment.
+        :return: int - the size of the segment in bytes, 0 if it does not exist.
+        """
+        try:
+            return os.path.getsize(self.segment_path(segment))
+        except OSError:
+            return 0
+
+    def append(self, block):
+        """
+        Appends a block to the last segment, or to a new segment if the last one is full, and then adds it
+        to the index.
+        :param block: The block at the next height.
+        :return: None.
+        """
+        frame = encode_frame(encode_block(block))
+        with self.lock:
+            offset = self.segment_file.tell()
+            if offset and offset + len(frame) > self.segment_size:
+                self.segment_file.close()
+                self.segment += 1
+                self.segment_file = open(self.segment_path(self.segment), 'ab')
+                offset = 0
+            self.segment_file.write(frame)
+            self.segment_file.flush()
+            self.index_file.write(INDEX_RECORD.pack(unhexlify(block.hash), self.segment, offset, len(frame)))
+            self.index_file.flush()
+            if self.sync:
+                os.fsync(self.segment_file.fileno())
+                os.fsync(self.index_file.fileno())
+            self.locations.append((self.segment, offset, len(frame)))
+            self.hashes.append(block.hash)
+            self.heights[block.hash] = len(self.locations)
+
+    def truncate(self, height):
+        """
+        Removes the blocks after a height from the index.
+        :param height: The number of blocks to be kept.
+        :return: None.
+        """
+        with self.lock:
+            if height >= len(self.locations):
+                return
+            for block_hash in self.hashes[height:]:
+                del self.heights[block_hash]
+            del self.locations[height:]
+            del self.hashes[height:]
+            self.index_file.truncate(height * INDEX_RECORD.size)
+            self.index_file.flush()
+            if self.sync:
+                os.fsync(self.index_file.fileno())
+
+    def segment_map(self, segment, end):
+        """
+        Gets the memory map of a segment covering a position. A segment which has grown since it was mapped
+        is mapped again.
+        :param segment: The number of the segment.
+        :param end: The position in the segment which has to be mapped.
+        :return: mmap object
+        """
+        segment_map = self.maps.get(segment)
+        if segment_map is None or len(segment_map) < end:
+            with open(self.segment_path(segment), 'rb') as segment_file:
+                segment_map = mmap.mmap(segment_file.fileno(), 0, access=mmap.ACCESS_READ)
+            self.maps[segment] = segment_map
+        return segment_map
+
+    def read_frame(self, height):
+        """
+        Reads the length-prefixed encoded block at a height, as it is sent to the peer nodes, without copying it.
+        :param height: The height of the block, starting from 1.
+        :return: memoryview - the bytes of the frame.
+        """
+        segment, offset, length = self.locations[height - 1]
+        return memoryview(self.segment_map(segment, offset + length))[offset:offset + length]
+
+    def read(self, height):
+        """
+        Reads the encoded block at a height without copying it.
+        :param height: The height of the block, starting from 1.
+        :return: memoryview - the bytes of the encoded block.
+        """
+        return self.read_frame(height)[LENGTH.size:]
+
+    def get(self, height):
+        """
+        Decodes the block at a height.
+        :param height: The height of the block, starting from 1.
+        :return: Block object
+        """
+        return decode_block(self.read(height))
+
+    def height_of(self, block_hash):
+        """
+        Finds the height of a block from its hash.
+        :param block_hash: The hash of the block.
+        :return: int - the height of the block, None if it is not stored.
+        """
+        return self.heights.get(block_hash)
+
+    def blocks(self, start=1, end=None):
+        """
+        Decodes the blocks in a range of heights.
+        :param start: The height of the first block.
+        :param end: The height of the last block, included. The last stored block by default.
+        :return: generator - the Block objects.
+        """
+        end = len(self.locations) if end is None else end
+        for height in range(start, end + 1):
+            yield self.get(height)
+
+    def headers(self, start=1, end=None):
+        """
+        Decodes the headers of the blocks in a range of heights, without their transactions.
+        :param start: The height of the first block.
+        :param end: The height of the last block, included. The last stored block by default.
+        :return: generator - the Block objects with no transactions loaded.
+        """
+        end = len(self.locations) if end is None else end
+        for height in range(start, end + 1):
+            yield decode_header(self.read(height))
+
+    def close(self):
+        """
+        Closes the files of the store. The memory maps are closed once the bytes read from them are released.
+        :return: None.
+        """
+        with self.lock:
+            self.segment_file.close()
+            self.index_file.close()
+            self.maps.clear()
@@ -0,0 +1,143 @@
+from concurrent.futures import ThreadPoolExecutor
+from json import dumps
+from time import perf_counter
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from codec import decode_frames
+from compression import COMPRESS_MIN_SIZE, compress
+from metrics import PEER_FAILURES, PEER_REQUEST_SECONDS
+
+
+class Broadcaster:
+    """
+    Sends requests to the peer nodes concurrently.
+    The requests share a session with keep-alive connection pools, run on a thread pool and time out per peer,
+    so that a broadcast takes about as long as the slowest peer instead of the sum over all the peers.
+    Request bodies from compress_min_size bytes are sent gzip compressed, and compressed responses are decoded
+    by the session. The latency and failures of the requests are recorded in the metrics per peer and path.
+    """
+    def __init__(self, timeout=5, workers=16, pool_size=10, compress_min_size=COMPRESS_MIN_SIZE):
+        self.timeout = timeout
+        self.compress_min_size = compress_min_size
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = ThreadPoolExecutor(workers)
+
+    def encode_body(self, payload=None, data=None, content_type='application/json'):
+        """
+        Encodes the body of a request to a peer node, and compresses it with gzip if it is large enough.
+        :param payload: The JSON body of the request, used if no binary body is given.
+        :param data: The binary body of the request.
+        :param content_type: The content type of the binary body.
+        :return: tuple - the bytes of the body and the headers describing it.
+        """
+        if data is None:
+            data = dumps(payload).encode('utf-8')
+            content_type = 'application/json'
+        headers = {'Content-Type': content_type}
+        if len(data) >= self.compress_min_size:
+            data = compress(data, 'gzip')
+            headers['Content-Encoding'] = 'gzip'
+        return data, headers
+
+    def post(self, node, path, payload, data=None, content_type=None):
+        """
+        Sends a POST request to a peer node.
+        :param node: The address of the peer node.
+        :param path: The path of the endpoint on the peer node.
+        :param payload: The JSON body of the request, or its query parameters if a binary body is sent.
+        :param data: The binary body of the request, if any.
+        :param content_type: The content type of the binary body.
+        :return: int - the status code of the response, None if the peer could not be reached in time.
+        """
+        start = perf_counter()
+        try:
+            if data is None:
+                data, headers = self.encode_body(payload)
+                response = self.session.post(f'{node}{path}', data=data, headers=headers, timeout=self.timeout)
+            else:
+                data, headers = self.encode_body(data=data, content_type=content_type)
+                response = self.session.post(f'{node}{path}', params=payload, data=data, headers=headers,
+                                             timeout=self.timeout)
+            status_code = response.status_code
+        except requests.exceptions.RequestException:
+            status_code = None
+        self.record(node, path, start, status_code is None or status_code >= 500)
+        return status_code
+
+    @staticmethod
+    def record(node, path, start, failed):
+        """
+        Records the latency of a request to a peer node, and its failure, in the metrics.
+        :param node: The address of the peer node.
+        :param path: The path of the endpoint on the peer node.
+        :param start: The perf_counter value when the request was sent.
+        :param failed: Determines whether the request failed.
+        :return: None.
+        """
+        PEER_REQUEST_SECONDS.observe(perf_counter() - start, (node, path))
+        if failed:
+            PEER_FAILURES.inc(1, (node, path))
+
+    def request(self, method, node, path, payload):
+        """
+        Sends a request to a peer node and decodes the JSON response.
+        :param method: The HTTP method of the request.
+        :param node: The address of the peer node.
+        :param path: The path of the endpoint on the peer node.
+        :param payload: The JSON body of the request.
+        :return: The decoded JSON body of the response.
+        :raises requests.exceptions.RequestException: if the peer could not be reached in time or the response
+        is not valid JSON.
+        """
+        start = perf_counter()
+        failed = True
+        try:
+            data, headers = self.encode_body(payload)
+            response = self.session.request(method, f'{node}{path}', data=data, headers=headers,
+                                            timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+            failed = False
+            return result
+        finally:
+            self.record(node, path, start, failed)
+
+    def stream_frames(self, node, path, params):
+        """
+        Sends a GET request to a peer node and splits the binary response into its length-prefixed frames
+        as it arrives, so that the whole response is never held in memory.
+        :param node: The address of the peer node.
+        :param path: The path of the endpoint on the peer node.
+        :param params: The query parameters of the request.
+        :return: generator - the bytes of each frame.
+        :raises requests.exceptions.RequestException: if the peer could not be reached in time.
+        """
+        start = perf_counter()
+        failed = True
+        try:
+            with self.session.get(f'{node}{path}', params=params, timeout=self.timeout, stream=True) as response:
+                response.raise_for_status()
+                yield from decode_frames(response.iter_content(65536))
+            failed = False
+        finally:
+            self.record(node, path, start, failed)
+
+    def post_all(self, node_list, path, payload, data=None, content_type=None):
+        """
+        Sends a POST request to all the peer nodes at once and waits for all the responses.
+        :param node_list: The list of peer nodes.
+        :param path: The path of the endpoint on the peer nodes.
+        :param payload: A function which creates the JSON body of the request for a peer node, or its query
+        parameters if a binary body is sent.
+        :param data: The binary body of the request sent to all the peer nodes, if any.
+        :param content_type: The content type of the binary body.
+        :return: dictionary - the status code of the response of each peer node, None for the unreachable ones.
+        """
+        futures = {node: self.executor.submit(self.post, node, path, payload(node), data, content_type)
+                   for node in node_list}
+        return {node: future.result() for node, future in futures.items()}
@@ -0,0 +1,118 @@
+from contextlib import contextmanager
+from threading import RLock
+
+from blockchain import Blockchain
+from broadcast import Broadcaster
+from codec import encode_block
+from snapshot import SNAPSHOT_INTERVAL
+
+
+class ChainState:
+    """
+    Holds the single blockchain of the node process shared by all the requests.
+    The blockchain is loaded from the database once and then kept current in memory by mining,
+    received blocks and conflict resolution. A lock serializes the requests using it, except for the nonce search,
+    the broadcasts to the peer nodes and the fetching of their chains.
+    """
+    def __init__(self, mysql, node_db, mining_workers=None, peer_timeout=5, mempool_size=10000, block_store=None,
+                 body_cache_size=256, snapshot_interval=SNAPSHOT_INTERVAL, trusted_snapshot=None):
+        self.mysql = mysql
+        self.node_db = node_db
+        self.block_store = block_store
+        self.body_cache_size = body_cache_size
+        self.snapshot_interval = snapshot_interval
+        self.trusted_snapshot = trusted_snapshot
+        self.mining_workers = mining_workers
+        self.mempool_size = mempool_size
+        self.broadcaster = Broadcaster(peer_timeout)
+        self.lock = RLock()
+        self.blockchain = None
+
+    def load(self):
+        """
+        Loads the blockchain from the database if it is not loaded yet.
+        :return: Blockchain object
+        """
+        with self.lock:
+            if self.blockchain is None:
+                self.blockchain = Blockchain(None,
+                                             self.mysql,
+                                             self.node_db,
+                                             mining_workers=self.mining_workers,
+                                             broadcaster=self.broadcaster,
+                                             mempool_size=self.mempool_size,
+                                             block_store=self.block_store,
+                                             body_cache_size=self.body_cache_size,
+                                             snapshot_interval=self.snapshot_interval,
+                                             trusted_snapshot=self.trusted_snapshot)
+            return self.blockchain
+
+    def mine(self, host, node_list):
+        """
+        Mines a block for a user and broadcasts it to the peer nodes. The lock on the blockchain is held only
+        to prepare the block and to append it, so that the other requests are served while the nonce is searched
+        and the block is broadcast.
+        :param host: The email of the user who receives the mining reward.
+        :param node_list: The list of nodes to which the block should broadcast.
+        :return: boolean - True: if at least half of the peer nodes rejected the block as out of sync.
+                           False: otherwise.
+                 None if the chain changed while mining, in which case the block is dropped.
+        """
+        with self.use(host) as blockchain:
+            block = blockchain.prepare_block()
+        blockchain.search_nonce(block)
+        with self.use(host) as blockchain:
+            data = encode_block(block)
+            if not blockchain.append_mined_block(block):
+                return None
+        return blockchain.broadcast_mined_block(data, node_list)
+
+    def add_transaction(self, host, sender, recipient, amount, signature, node_list):
+        """
+        Adds a transaction signed by a user to the open transactions and broadcasts it to the peer nodes.
+        The lock on the blockchain is released before the transaction is broadcast.
+        :param host: The email of the user.
+        :param sender: The sender of the transaction.
+        :param recipient: The recipient of the transaction.
+        :param amount: The amount of the transaction.
+        :param signature: The signature of the transaction.
+        :param node_list: The list of nodes to which the transaction should broadcast.
+        :return: boolean - True: if the transaction is added and no peer node rejected it.
+                           False: otherwise.
+        """
+        with self.use(host) as blockchain:
+            transaction = blockchain.admit_transaction(sender, recipient, amount, signature)
+        if transaction is None:
+            return False
+        return blockchain.broadcast_transaction(transaction, node_list)
+
+    def resolve(self, host, node_list):
+        """
+        Replaces the chain with the longest valid chain of the peer nodes. The peer chains are fetched and
+        validated against a copy of the chain without holding the lock on the blockchain, which is held only
+        to copy the chain and to replace it.
+        :param host: The email of the user who resolves the conflicts.
+        :param node_list: The list of peer nodes.
+        :return: boolean - True: if the chain is replaced.
+                           False: otherwise.
+        """
+        with self.use(host) as blockchain:
+            chain = blockchain.chain[:]
+            validated_length = blockchain.validated_length()
+        candidate = blockchain.fetch_longest_chain(node_list, chain, validated_length)
+        if candidate is None:
+            return False
+        with self.use(host) as blockchain:
+            return blockchain.replace_chain(*candidate)
+
+    @contextmanager
+    def use(self, host):
+        """
+        Holds the lock on the blockchain while it is used by a request.
+        :param host: The email of the user the blockchain operations are performed for.
+        :return: Blockchain object with the user as the host.
+        """
+        with self.lock:
+            blockchain = self.load()
+            blockchain.host = host
+            yield blockchain
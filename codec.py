@@ -0,0 +1,159 @@
+from binascii import hexlify, unhexlify
+from struct import Struct, error as StructError
+from sys import intern
+
+from block import Block
+from transaction import transaction_id
+
+VERSION = 1
+BLOCK_MIMETYPE = 'application/x-jiocoin-block'
+
+TRANSACTION_HEADER = Struct('<IdqHHH')
+BLOCK_HEADER = Struct('<BIqHHH32sI')
+LENGTH = Struct('<I')
+
+
+def encode_transaction(transaction):
+    """
+    Encodes a transaction in the compact binary format: the index, amount, nonce and field lengths in a fixed
+    size header, followed by the sender, the recipient and the raw bytes of the signature.
+    :param transaction: The transaction as a dictionary.
+    :return: bytes - the encoded transaction.
+    """
+    sender = transaction['sender'].encode('utf-8')
+    recipient = transaction['recipient'].encode('utf-8')
+    signature = unhexlify(transaction['signature'])
+    if hexlify(signature).decode('ascii') != transaction['signature']:
+        raise ValueError('The signature is not a lowercase hexadecimal string')
+    header = TRANSACTION_HEADER.pack(transaction['index'],
+                                     float(transaction['amount']),
+                                     transaction.get('nonce', 0),
+                                     len(sender),
+                                     len(recipient),
+                                     len(signature))
+    return b''.join([header, sender, recipient, signature])
+
+
+def decode_transaction(data, offset=0):
+    """
+    Decodes a transaction from the compact binary format.
+    :param data: The bytes containing the encoded transaction.
+    :param offset: The position of the encoded transaction in the bytes.
+    :return: tuple - the transaction as a dictionary and the position after the encoded transaction.
+    """
+    index, amount, nonce, sender_length, recipient_length, signature_length = \
+        TRANSACTION_HEADER.unpack_from(data, offset)
+    offset += TRANSACTION_HEADER.size
+    sender = bytes(data[offset:offset + sender_length]).decode('utf-8')
+    offset += sender_length
+    recipient = bytes(data[offset:offset + recipient_length]).decode('utf-8')
+    offset += recipient_length
+    signature = hexlify(data[offset:offset + signature_length]).decode('ascii')
+    offset += signature_length
+    transaction = {'index': index,
+                   'sender': intern(sender),
+                   'recipient': intern(recipient),
+                   'amount': amount,
+                   'signature': signature,
+                   'nonce': nonce}
+    transaction['id'] = transaction_id(transaction)
+    return transaction, offset
+
+
+def encode_block(block):
+    """
+    Encodes a block in the versioned compact binary format: the version, index, nonce, field lengths, raw Merkle
+    root and number of transactions in a fixed size header, followed by the hash, the previous hash, the timestamp
+    and the encoded transactions.
+    :param block: The block to be encoded.
+    :return: bytes - the encoded block.
+    """
+    block_hash = (block.hash or '').encode('ascii')
+    previous_hash = block.previous_hash.encode('ascii')
+    timestamp = block.timestamp.encode('ascii')
+    header = BLOCK_HEADER.pack(VERSION,
+                               block.index,
+                               block.nonce,
+                               len(block_hash),
+                               len(previous_hash),
+                               len(timestamp),
+                               unhexlify(block.merkle_root),
+                               len(block.transactions))
+    parts = [header, block_hash, previous_hash, timestamp]
+    parts.extend(encode_transaction(transaction) for transaction in block.transactions)
+    return b''.join(parts)
+
+
+def decode_block(data, offset=0):
+    """
+    Decodes a block from the compact binary format.
+    :param data: The bytes containing the encoded block.
+    :param offset: The position of the encoded block in the bytes.
+    :return: Block object
+    :raises ValueError: if the bytes are not a valid encoded block.
+    """
+    try:
+        return _decode_block(data, offset, True)
+    except StructError as e:
+        raise ValueError(f'Truncated block encoding: {e}') from e
+
+
+def decode_header(data, offset=0):
+    """
+    Decodes the header of a block from the compact binary format, without its transactions.
+    :param data: The bytes containing the encoded block.
+    :param offset: The position of the encoded block in the bytes.
+    :return: Block object with no transactions loaded.
+    :raises ValueError: if the bytes are not a valid encoded block.
+    """
+    try:
+        return _decode_block(data, offset, False)
+    except StructError as e:
+        raise ValueError(f'Truncated block encoding: {e}') from e
+
+
+def _decode_block(data, offset, with_transactions):
+    version, index, nonce, hash_length, previous_hash_length, timestamp_length, root, count = \
+        BLOCK_HEADER.unpack_from(data, offset)
+    if version != VERSION:
+        raise ValueError(f'Unsupported block encoding version {version}')
+    offset += BLOCK_HEADER.size
+    block_hash = bytes(data[offset:offset + hash_length]).decode('ascii') or None
+    offset += hash_length
+    previous_hash = bytes(data[offset:offset + previous_hash_length]).decode('ascii')
+    offset += previous_hash_length
+    timestamp = bytes(data[offset:offset + timestamp_length]).decode('ascii')
+    offset += timestamp_length
+    transactions = [] if with_transactions else None
+    for _ in range(count if with_transactions else 0):
+        transaction, offset = decode_transaction(data, offset)
+        transactions.append(transaction)
+    return Block(index, previous_hash, timestamp, transactions, block_hash, nonce, hexlify(root).decode('ascii'))
+
+
+def encode_frame(data):
+    """
+    Prefixes encoded bytes with their length, so that several encoded blocks can be sent one after another.
+    :param data: The encoded bytes.
+    :return: bytes - the length-prefixed bytes.
+    """
+    return LENGTH.pack(len(data)) + data
+
+
+def decode_frames(chunks):
+    """
+    Splits a stream of length-prefixed frames back into the encoded bytes of each frame.
+    :param chunks: An iterable of byte chunks of the stream.
+    :return: generator - the bytes of each frame.
+    """
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= LENGTH.size:
+            length, = LENGTH.unpack_from(buffer)
+            if len(buffer) < LENGTH.size + length:
+                break
+            yield bytes(buffer[LENGTH.size:LENGTH.size + length])
+            del buffer[:LENGTH.size + length]
+    if buffer:
+        raise ValueError('The stream ends with an incomplete frame')
@@ -0,0 +1,152 @@
+from io import BytesIO
+import zlib
+
+from werkzeug.exceptions import BadRequest, UnsupportedMediaType
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESS_MIN_SIZE = 1024
+MAX_DECOMPRESSED_SIZE = 64 * 1024 * 1024
+WBITS = {'gzip': 31, 'deflate': 15}
+ENCODINGS = ('zstd', 'gzip', 'deflate') if zstandard is not None else ('gzip', 'deflate')
+DECOMPRESS_ERRORS = (zlib.error, zstandard.ZstdError) if zstandard is not None else (zlib.error,)
+
+
+def compressor(encoding):
+    """
+    Creates an incremental compressor for a content encoding.
+    :param encoding: The content encoding, one of ENCODINGS.
+    :return: compressor object with compress and flush methods.
+    """
+    if encoding == 'zstd':
+        return zstandard.ZstdCompressor().compressobj()
+    return zlib.compressobj(6, zlib.DEFLATED, WBITS[encoding])
+
+
+def compress(data, encoding):
+    """
+    Compresses a body with a content encoding.
+    :param data: The bytes of the body.
+    :param encoding: The content encoding, one of ENCODINGS.
+    :return: bytes - the compressed body.
+    """
+    body_compressor = compressor(encoding)
+    return body_compressor.compress(data) + body_compressor.flush()
+
+
+def compress_stream(chunks, encoding):
+    """
+    Compresses a streamed body chunk by chunk, so that the whole body is never held in memory.
+    :param chunks: An iterable of the byte chunks of the body.
+    :param encoding: The content encoding, one of ENCODINGS.
+    :return: generator - the chunks of the compressed body.
+    """
+    body_compressor = compressor(encoding)
+    for chunk in chunks:
+        compressed = body_compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield body_compressor.flush()
+
+
+def decompress(data, encoding, max_size=MAX_DECOMPRESSED_SIZE):
+    """
+    Decompresses a body with a content encoding. The decompressed size is bounded, so that a small compressed
+    body cannot expand without limit.
+    :param data: The bytes of the compressed body.
+    :param encoding: The content encoding, one of ENCODINGS.
+    :param max_size: The largest decompressed size accepted.
+    :return: bytes - the decompressed body.
+    :raises ValueError: if the encoding is not supported, the body is corrupt or it decompresses beyond max_size.
+    """
+    try:
+        if encoding == 'zstd' and zstandard is not None:
+            with zstandard.ZstdDecompressor().stream_reader(BytesIO(data)) as reader:
+                result = reader.read(max_size + 1)
+        elif encoding in WBITS:
+            result = zlib.decompressobj(WBITS[encoding]).decompress(data, max_size + 1)
+        else:
+            raise ValueError(f'Unsupported content encoding {encoding}')
+    except DECOMPRESS_ERRORS as e:
+        raise ValueError(f'Corrupt {encoding} body: {e}') from e
+    if len(result) > max_size:
+        raise ValueError('The decompressed body is too large')
+    return result
+
+
+def negotiate(accept_encoding):
+    """
+    Chooses the content encoding of a response from the Accept-Encoding header of the request.
+    :param accept_encoding: The value of the Accept-Encoding header.
+    :return: string - the preferred encoding accepted by the client, None if the client accepts none of them.
+    """
+    accepted = {}
+    for item in accept_encoding.lower().split(','):
+        name, _, params = item.strip().partition(';')
+        quality = 1.0
+        if params.strip().startswith('q='):
+            try:
+                quality = float(params.strip()[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip()] = quality
+    for encoding in ENCODINGS:
+        if accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return None
+
+
+def compress_response(response, accept_encoding, min_size=COMPRESS_MIN_SIZE):
+    """
+    Compresses the body of a response with the encoding negotiated with the client. Bodies smaller than min_size
+    are sent as they are, and streamed bodies are compressed as they are streamed.
+    :param response: The response of the Flask view.
+    :param accept_encoding: The value of the Accept-Encoding header of the request.
+    :param min_size: The smallest body size which is compressed.
+    :return: The response, compressed if the client accepts it.
+    """
+    if response.direct_passthrough or 'Content-Encoding' in response.headers or \
+            response.status_code < 200 or response.status_code in (204, 304):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate(accept_encoding)
+    if encoding is None:
+        return response
+    if response.is_streamed:
+        response.response = compress_stream(response.iter_encoded(), encoding)
+        response.headers.pop('Content-Length', None)
+    else:
+        data = response.get_data()
+        if len(data) < min_size:
+            return response
+        response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    return response
+
+
+class DecompressRequests:
+    """
+    WSGI middleware which decompresses the request bodies sent with a Content-Encoding before they reach
+    the Flask application, so that the views read them as usual.
+    """
+    def __init__(self, wsgi_app, max_size=MAX_DECOMPRESSED_SIZE):
+        self.wsgi_app = wsgi_app
+        self.max_size = max_size
+
+    def __call__(self, environ, start_response):
+        encoding = environ.get('HTTP_CONTENT_ENCODING', '').strip().lower()
+        if encoding and encoding != 'identity':
+            if encoding not in ENCODINGS:
+                return UnsupportedMediaType(f'Unsupported content encoding {encoding}')(environ, start_response)
+            length = int(environ.get('CONTENT_LENGTH') or 0)
+            try:
+                body = decompress(environ['wsgi.input'].read(length), encoding, self.max_size)
+            except ValueError as e:
+                return BadRequest(str(e))(environ, start_response)
+            environ['wsgi.input'] = BytesIO(body)
+            environ['CONTENT_LENGTH'] = str(len(body))
+            del environ['HTTP_CONTENT_ENCODING']
+        return self.wsgi_app(environ, start_response)
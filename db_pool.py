@@ -0,0 +1,258 @@
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
+from threading import Lock, local
+from time import time
+
+from sql_util import MySQLDialect
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no connection could be checked out of the pool within the checkout timeout.
+    """
+
+
+class ConnectionPool(ABC):
+    """
+    Keeps a bounded number of open connections to a database and lends them to the queries.
+    Connections are opened lazily up to the pool size. When all of them are in use, a checkout waits for one
+    to be returned until the checkout timeout expires.
+    A connection checked out for a transaction stays bound to the thread, so that all the queries executed
+    inside the transaction share it.
+    The connections are opened, checked and queried by the connect and ping methods and the SQL dialect,
+    which the pool of each storage backend defines. The pool itself depends on no database driver, and a backend
+    missing one of the abstract methods cannot be instantiated.
+    """
+    dialect = None
+    errors = ()
+
+    def __init__(self, database=None, size=5, timeout=10):
+        self.database = database
+        self.size = size
+        self.timeout = timeout
+        self.idle = LifoQueue()
+        self.bound = local()
+        self.lock = Lock()
+        self.created = 0
+        self.in_use = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.wait_time = 0.0
+
+    def __repr__(self):
+        """
+        Returns the statistics of the pool as a string.
+        :return: string - pool statistics
+        """
+        return str(self.stats())
+
+    @abstractmethod
+    def connect(self):
+        """
+        Opens a new connection to the database of the pool.
+        :return: connection object
+        """
+
+    def ping(self, conn):
+        """
+        Checks that an idle connection is still open before it is lent again.
+        :param conn: The connection object taken from the pool.
+        :return: None.
+        """
+
+    @abstractmethod
+    def create_database(self, db_name):
+        """
+        Creates a database, if it does not exist yet.
+        :param db_name: The name of the database.
+        :return: boolean - True: if the database is created or already exists.
+        """
+
+    def checkout(self):
+        """
+        Takes an idle connection from the pool. Opens a new connection if the pool is not full,
+        otherwise waits for a connection to be returned to the pool.
+        :return: MySQL connection object
+        """
+        conn = None
+        create = False
+        with self.lock:
+            try:
+                conn = self.idle.get_nowait()
+            except Empty:
+                if self.created < self.size:
+                    self.created += 1
+                    create = True
+                else:
+                    self.waits += 1
+
+        if create:
+            try:
+                conn = self.connect()
+            except self.errors:
+                with self.lock:
+                    self.created -= 1
+                raise
+        elif conn is None:
+            start = time()
+            try:
+                conn = self.idle.get(timeout=self.timeout)
+            except Empty:
+                with self.lock:
+                    self.timeouts += 1
+                raise PoolTimeout(f'No connection to {self.database} available after {self.timeout} seconds')
+            finally:
+                with self.lock:
+                    self.wait_time += time() - start
+        if not create:
+            try:
+                self.ping(conn)
+            except self.errors:
+                with self.lock:
+                    self.created -= 1
+                raise
+
+        with self.lock:
+            self.in_use += 1
+            self.checkouts += 1
+        return conn
+
+    def checkin(self, conn):
+        """
+        Returns a connection to the pool. The transaction left open by the reads on the connection is rolled back,
+        so that the next query on it sees the rows committed since then on the other connections.
+        A connection which cannot be rolled back is dropped.
+        :param conn: The MySQL connection object checked out of the pool.
+        :return: None.
+        """
+        try:
+            conn.rollback()
+        except self.errors:
+            with self.lock:
+                self.in_use -= 1
+                self.created -= 1
+            return
+        with self.lock:
+            self.in_use -= 1
+        self.idle.put(conn)
+
+    @contextmanager
+    def connection(self):
+        """
+        Lends a connection for a query. The connection bound to the thread by a transaction is reused.
+        :return: MySQL connection object
+        """
+        conn = getattr(self.bound, 'conn', None)
+        if conn is not None:
+            yield conn
+            return
+        conn = self.checkout()
+        try:
+            yield conn
+        finally:
+            self.checkin(conn)
+
+    @contextmanager
+    def transaction(self):
+        """
+        Groups the queries executed inside the block into a single database transaction.
+        The queries are committed together when the block exits, or rolled back if it raises.
+        :return: MySQL connection object
+        """
+        if self.in_transaction():
+            yield self.bound.conn
+            return
+        conn = self.checkout()
+        self.bound.conn = conn
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self.bound.conn = None
+            self.checkin(conn)
+
+    def in_transaction(self):
+        """
+        Checks whether the thread is inside a transaction.
+        :return: boolean - True: if a connection is bound to the thread by a transaction.
+                           False: if it is not.
+        """
+        return getattr(self.bound, 'conn', None) is not None
+
+    def stats(self):
+        """
+        Gets the statistics of the pool.
+        :return: dictionary - the pool size, the checkout timeout and the connection usage counters.
+        """
+        with self.lock:
+            return {'database': self.database,
+                    'size': self.size,
+                    'timeout': self.timeout,
+                    'created': self.created,
+                    'in_use': self.in_use,
+                    'idle': self.idle.qsize(),
+                    'checkouts': self.checkouts,
+                    'waits': self.waits,
+                    'timeouts': self.timeouts,
+                    'wait_time': self.wait_time}
+
+
+class MySQLPool(ConnectionPool):
+    """
+    Keeps a bounded number of open connections to a MySQL database and lends them to the queries.
+    The MySQL driver and the credentials in config.py are imported by the pool rather than by its module,
+    so that the other storage backends are used without them.
+    """
+    dialect = MySQLDialect
+
+    def __init__(self, database=None, size=5, timeout=10):
+        from mysql.connector import Error
+
+        super().__init__(database, size, timeout)
+        self.errors = (Error,)
+
+    def connect(self):
+        """
+        Opens a new connection to the MySQL database of the pool, or to the server if the pool has no database.
+        :return: MySQL connection object
+        """
+        import mysql.connector as sql
+        from config import _mysql_user, _mysql_password
+
+        if self.database is None:
+            return sql.connect(host='localhost', user=_mysql_user, password=_mysql_password)
+        return sql.connect(host='localhost', user=_mysql_user, password=_mysql_password, database=self.database)
+
+    def ping(self, conn):
+        """
+        Checks that an idle connection is still open, and reconnects it if it is not.
+        :param conn: The MySQL connection object taken from the pool.
+        :return: None.
+        """
+        conn.ping(reconnect=True, attempts=2)
+
+    def create_database(self, db_name):
+        """
+        Creates a database on the MySQL server of the pool, if it does not exist yet.
+        :param db_name: The name of the database.
+        :return: boolean - True: if the database is created or already exists.
+                           False: if the database is not created because of any error.
+        """
+        with self.connection() as conn:
+            cur = conn.cursor()
+            try:
+                cur.execute(f"CREATE DATABASE {db_name}")
+                return 1
+            except self.errors as e:
+                x = e.args[0]
+                if x == 1007:
+                    return 1
+                else:
+                    return 0
+            finally:
+                cur.close()
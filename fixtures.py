@@ -0,0 +1,71 @@
+"""
+Builders of the chains and databases used by the tests and the benchmarks.
+"""
+import os
+from time import time
+
+from block import Block
+from blockchain import MINING_REWARD, MINING_SENDER
+from helper import hash_block_data, ordered_dict
+from storage import SQLitePool
+from transaction import Transaction
+
+HOST = 'miner@jiocoin.bench'
+GENESIS_HASH = '0' * 62 + 'x0'
+
+
+def fake_signature(height, position):
+    """
+    Creates an unverifiable signature of the size of a real one, which differs for each transaction of the chain,
+    so that the transactions with the same content have different IDs.
+    :param height: The index of the block of the transaction.
+    :param position: The position of the transaction in the block.
+    :return: string - the signature as a hexadecimal string.
+    """
+    return f'{height:0504x}{position:08x}'
+
+
+def make_storage(directory, name):
+    """
+    Creates an empty embedded database for a test or a benchmark.
+    :param directory: The directory of the database files.
+    :param name: The name of the database file.
+    :return: SQLitePool object
+    """
+    path = os.path.join(directory, f'{name}.sqlite3')
+    if os.path.exists(path):
+        os.remove(path)
+    return SQLitePool(path)
+
+
+def make_block(height, previous_hash, transactions_per_block=0):
+    """
+    Creates a block with a mining reward and unsigned payments, whose hash is not mined.
+    :param height: The index of the block.
+    :param previous_hash: The hash of the previous block.
+    :param transactions_per_block: The number of payments in the block besides the mining reward.
+    :return: Block object
+    """
+    transactions = [Transaction(position, f'user{position}@jiocoin.bench', HOST, 1.0,
+                                fake_signature(height, position)).to_dict()
+                    for position in range(transactions_per_block)]
+    transactions.append(Transaction(transactions_per_block, MINING_SENDER, HOST, MINING_REWARD, '', height).to_dict())
+    block = Block(height, previous_hash, str(time()), ordered_dict(transactions))
+    block.hash = hash_block_data(block)
+    return block
+
+
+def make_chain(length, transactions_per_block=0):
+    """
+    Creates a chain of linked blocks which is valid with difficulty 0.
+    :param length: The number of blocks.
+    :param transactions_per_block: The number of payments in each block besides the mining reward.
+    :return: list of Block objects
+    """
+    chain = []
+    previous_hash = GENESIS_HASH
+    for height in range(1, length + 1):
+        block = make_block(height, previous_hash, transactions_per_block)
+        chain.append(block)
+        previous_hash = block.hash
+    return chain
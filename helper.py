@@ -1,46 +1,160 @@
 from hashlib import sha256
 from collections import OrderedDict
-import json
+from sys import intern
+from threading import Lock
+
+from transaction import canonical_signature, transaction_id
 
 
 def hash_block_data(block):
     """
-    Creates a SHA-256 hash object of the block.
+    Creates a SHA-256 hash object of the block header. The transactions are covered by the Merkle root in the header.
+    The hash is cached on the block until its header changes.
     :param block: The block to be hashed.
     :return: string - the encoded block in hexadecimal string format.
     """
-    block_copy = block.__dict__.copy()
-    del block_copy['hash']
-    block_copy['transactions'] = ordered_dict(block_copy['transactions'])
-    return sha256(str(block_copy).encode('utf-8')).hexdigest()
+    if block.header_hash is None:
+        block.header_hash = sha256(str(block.header()).encode('utf-8')).hexdigest()
+    return block.header_hash
 
 
-def is_json(string_elt):
+class Placeholder:
     """
-    Checks whether a string is valid json or not.
-    :param string_elt: The string to be checked.
-    :return: boolean - True: if the string is valid json
-                       False: if the string is not valid json
+    Stands in for a block attribute while the block is serialized, so that its position in the serialized block
+    can be found.
     """
-    try:
-        json.loads(string_elt)
-    except (ValueError, TypeError):
-        return False
-    return True
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return f'\x00{self.name}\x00'
+
+
+class BlockHasher:
+    """
+    Hashes a block for different nonces and timestamps without serializing the whole block again.
+    The block header is serialized once with placeholders for the nonce and the timestamp. The part before the nonce
+    is fed into a SHA-256 object which is copied for each attempt, and only the nonce, the timestamp and the
+    pre-encoded parts between and after them, which end with the Merkle root, are hashed on top of it.
+    The hashes are identical to the ones of hash_block_data.
+    """
+    def __init__(self, block):
+        nonce, timestamp = Placeholder('nonce'), Placeholder('timestamp')
+        block_copy = block.header()
+        block_copy['nonce'] = nonce
+        block_copy['timestamp'] = timestamp
+        serialized = str(block_copy)
+        nonce_at = serialized.index(repr(nonce))
+        timestamp_at = serialized.index(repr(timestamp))
+        self.prefix = sha256(serialized[:nonce_at].encode('utf-8'))
+        self.middle = serialized[nonce_at + len(repr(nonce)):timestamp_at].encode('utf-8')
+        self.suffix = serialized[timestamp_at + len(repr(timestamp)):].encode('utf-8')
+
+    def hash(self, nonce, timestamp):
+        """
+        Creates the SHA-256 hash of the block with a nonce and a timestamp.
+        :param nonce: The nonce of the block.
+        :param timestamp: The timestamp of the block.
+        :return: string - the encoded block in hexadecimal string format.
+        """
+        hash_object = self.prefix.copy()
+        hash_object.update(repr(nonce).encode('utf-8'))
+        hash_object.update(self.middle)
+        hash_object.update(repr(timestamp).encode('utf-8'))
+        hash_object.update(self.suffix)
+        return hash_object.hexdigest()
 
 
 def ordered_dict(transactions):
     """
-    Converts the dictionary object transactions to the ordered dictionary transactions.
+    Converts the dictionary object transactions to dictionaries with their keys in the canonical order.
+    The amount is converted to a float and the signature to lowercase, as they are decoded from the binary
+    encoding, and the ID of each transaction is recomputed from its content.
     :param transactions: A list of dictionary object transactions
-    :return: list of ordered dictionary - a list of ordered dictionary objects of transaction.
+    :return: list of dictionaries - a list of the transactions with ordered keys.
+    :raises TypeError, ValueError: if the amount is not a number or the signature is not a hexadecimal string.
     """
     ordered_transactions = []
     for transaction in transactions:
-        ordered_transaction = OrderedDict([('index', transaction['index']),
-                                           ('sender', transaction['sender']),
-                                           ('recipient', transaction['recipient']),
-                                           ('amount', transaction['amount']),
-                                           ('signature', transaction['signature'])])
+        ordered_transaction = {'index': transaction['index'],
+                               'sender': intern(transaction['sender']),
+                               'recipient': intern(transaction['recipient']),
+                               'amount': float(transaction['amount']),
+                               'signature': canonical_signature(transaction['signature']),
+                               'nonce': transaction.get('nonce', 0)}
+        ordered_transaction['id'] = transaction_id(ordered_transaction)
         ordered_transactions.append(ordered_transaction)
     return ordered_transactions
+
+
+class LRUCache:
+    """
+    A bounded mapping which discards the least recently used items when it is full.
+    The cache can be shared between threads.
+    """
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.items
+
+    def __len__(self):
+        return len(self.items)
+
+    def get(self, key, default=None):
+        """
+        Gets an item from the cache and marks it as the most recently used.
+        :param key: The key of the item.
+        :param default: The value returned if the key is not in the cache.
+        :return: The value of the item.
+        """
+        with self.lock:
+            try:
+                self.items.move_to_end(key)
+            except KeyError:
+                return default
+            return self.items[key]
+
+    def put(self, key, value):
+        """
+        Adds an item to the cache and discards the least recently used item if the cache is full.
+        :param key: The key of the item.
+        :param value: The value of the item.
+        :return: None.
+        """
+        with self.lock:
+            self.items[key] = value
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)
+
+    def pop(self, key, default=None):
+        """
+        Removes an item from the cache.
+        :param key: The key of the item.
+        :param default: The value returned if the key is not in the cache.
+        :return: The value of the removed item.
+        """
+        with self.lock:
+            return self.items.pop(key, default)
+
+    def discard_if(self, predicate):
+        """
+        Removes the items whose keys match a condition.
+        :param predicate: A function of the key which returns True for the items to be removed.
+        :return: None.
+        """
+        with self.lock:
+            for key in [key for key in self.items if predicate(key)]:
+                del self.items[key]
+
+    def clear(self):
+        """
+        Removes all the items from the cache.
+        :return: None.
+        """
+        with self.lock:
+            self.items.clear()
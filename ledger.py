@@ -0,0 +1,94 @@
+class Ledger:
+    """
+    Keeps the confirmed balance of every address in the blockchain.
+    The balances are updated block by block as the chain changes, and the addresses changed since the last save
+    are tracked so that only their rows have to be written to the database.
+    """
+    def __init__(self, balances=None):
+        self.balances = dict(balances or {})
+        self.changed = set()
+
+    def __repr__(self):
+        """
+        Returns the balances of the addresses as a string.
+        :return: string - balances
+        """
+        return str(self.balances)
+
+    def balance(self, address):
+        """
+        Gets the confirmed balance of an address.
+        :param address: The address whose balance is requested.
+        :return: float - the balance of the address.
+        """
+        return self.balances.get(address, 0)
+
+    def apply_transactions(self, transactions, direction=1):
+        """
+        Moves the amount of each transaction from the sender to the recipient.
+        :param transactions: A list of dictionary object transactions.
+        :param direction: 1 to apply the transactions, -1 to revert them.
+        :return: None.
+        """
+        for transaction in transactions:
+            amount = transaction['amount'] * direction
+            self.balances[transaction['sender']] = self.balance(transaction['sender']) - amount
+            self.balances[transaction['recipient']] = self.balance(transaction['recipient']) + amount
+            self.changed.add(transaction['sender'])
+            self.changed.add(transaction['recipient'])
+
+    def apply_block(self, block):
+        """
+        Applies the transactions of a block appended to the chain.
+        :param block: The block appended to the chain.
+        :return: None.
+        """
+        self.apply_transactions(block.transactions)
+
+    def revert_block(self, block):
+        """
+        Reverts the transactions of a block removed from the chain.
+        :param block: The block removed from the chain.
+        :return: None.
+        """
+        self.apply_transactions(block.transactions, -1)
+
+    def switch_chain(self, old_chain, new_chain):
+        """
+        Updates the balances when the chain is replaced by reverting the old blocks after the common prefix
+        of the two chains and applying the new ones.
+        :param old_chain: The list of blocks the balances currently reflect.
+        :param new_chain: The list of blocks replacing it.
+        :return: None.
+        """
+        common_length = 0
+        for old_block, new_block in zip(old_chain, new_chain):
+            if old_block.hash != new_block.hash:
+                break
+            common_length += 1
+        for block in reversed(old_chain[common_length:]):
+            self.revert_block(block)
+        for block in new_chain[common_length:]:
+            self.apply_block(block)
+
+    def restore(self, balances, blocks=()):
+        """
+        Replaces the balances with the balances of a saved state, and then applies the blocks after that state.
+        All the addresses of the old and new balances are marked as changed.
+        :param balances: The balance of every address in the saved state.
+        :param blocks: The list of blocks after the saved state.
+        :return: None.
+        """
+        self.changed.update(self.balances)
+        self.balances = dict(balances)
+        self.changed.update(self.balances)
+        for block in blocks:
+            self.apply_block(block)
+
+    def rebuild(self, chain):
+        """
+        Recomputes the balances from scratch by applying every block of the chain.
+        :param chain: The list of blocks.
+        :return: None.
+        """
+        self.restore({}, chain)
@@ -0,0 +1,120 @@
+from collections import OrderedDict
+
+from transaction import transaction_id
+
+
+class Mempool:
+    """
+    Keeps the open transactions in the order they were added, keyed by their ID.
+    Adding, looking up and removing a transaction take constant time. A secondary index keeps the transactions
+    and the total amount sent by each sender. Duplicate transactions are rejected, and the oldest transactions
+    are evicted when the mempool is full.
+    """
+    def __init__(self, transactions=(), max_size=10000):
+        self.max_size = max_size
+        self.transactions = OrderedDict()
+        self.senders = {}
+        self.outgoing = {}
+        for transaction in transactions:
+            self.add(transaction)
+
+    def __repr__(self):
+        """
+        Returns the list of open transactions as a string.
+        :return: string - open transactions
+        """
+        return str(list(self.transactions.values()))
+
+    def __len__(self):
+        return len(self.transactions)
+
+    def __iter__(self):
+        return iter(list(self.transactions.values()))
+
+    def __contains__(self, tnx_id):
+        return tnx_id in self.transactions
+
+    def get(self, tnx_id):
+        """
+        Gets a transaction by its ID.
+        :param tnx_id: The ID of the transaction.
+        :return: dictionary - the transaction, None if it is not in the mempool.
+        """
+        return self.transactions.get(tnx_id)
+
+    def next_index(self):
+        """
+        Gets the index for a new transaction, one more than the index of the newest transaction.
+        :return: int - the index of the new transaction.
+        """
+        if not self.transactions:
+            return 1
+        return next(reversed(self.transactions.values()))['index'] + 1
+
+    def add(self, transaction):
+        """
+        Adds a transaction to the mempool and evicts the oldest transaction if the mempool is full.
+        :param transaction: The transaction as a dictionary.
+        :return: boolean - True: if the transaction is added.
+                           False: if the transaction is already in the mempool.
+        """
+        tnx_id = transaction_id(transaction)
+        if tnx_id in self.transactions:
+            return False
+        transaction['id'] = tnx_id
+        self.transactions[tnx_id] = transaction
+        self.senders.setdefault(transaction['sender'], OrderedDict())[tnx_id] = transaction
+        self.outgoing[transaction['sender']] = self.outgoing.get(transaction['sender'], 0) + transaction['amount']
+        while len(self.transactions) > self.max_size:
+            self.remove(next(iter(self.transactions)))
+        return True
+
+    def remove(self, tnx_id):
+        """
+        Removes a transaction from the mempool by its ID.
+        :param tnx_id: The ID of the transaction.
+        :return: dictionary - the removed transaction, None if it is not in the mempool.
+        """
+        transaction = self.transactions.pop(tnx_id, None)
+        if transaction is None:
+            return None
+        sender = transaction['sender']
+        del self.senders[sender][tnx_id]
+        self.outgoing[sender] -= transaction['amount']
+        if not self.senders[sender]:
+            del self.senders[sender]
+            del self.outgoing[sender]
+        return transaction
+
+    def remove_transaction(self, transaction):
+        """
+        Removes a transaction from the mempool.
+        :param transaction: The transaction as a dictionary.
+        :return: dictionary - the removed transaction, None if it is not in the mempool.
+        """
+        return self.remove(transaction_id(transaction))
+
+    def by_sender(self, sender):
+        """
+        Gets the open transactions of a sender.
+        :param sender: The sender of the transactions.
+        :return: list of dictionaries - the transactions of the sender in the order they were added.
+        """
+        return list(self.senders.get(sender, {}).values())
+
+    def outgoing_amount(self, sender):
+        """
+        Gets the total amount sent by a sender in the open transactions.
+        :param sender: The sender of the transactions.
+        :return: float - the total amount.
+        """
+        return self.outgoing.get(sender, 0)
+
+    def clear(self):
+        """
+        Removes all the transactions from the mempool.
+        :return: None.
+        """
+        self.transactions.clear()
+        self.senders.clear()
+        self.outgoing.clear()
@@ -0,0 +1,78 @@
+from hashlib import sha256
+
+from transaction import transaction_id
+
+EMPTY_ROOT = '0' * 64
+
+
+def hash_pair(left, right):
+    """
+    Creates the SHA-256 hash of two nodes of the Merkle tree.
+    :param left: The hash of the left node.
+    :param right: The hash of the right node.
+    :return: string - the hash of the parent node in hexadecimal string format.
+    """
+    return sha256((left + right).encode('utf-8')).hexdigest()
+
+
+def next_level(level):
+    """
+    Hashes the nodes of a level of the Merkle tree in pairs. The last node is paired with itself
+    if the level has an odd number of nodes. Repeating the last transactions of a block therefore keeps its root
+    (CVE-2012-2459), so the blocks whose transactions repeat are rejected before their root is checked.
+    :param level: The list of hashes of a level.
+    :return: list of strings - the hashes of the level above.
+    """
+    if len(level) % 2:
+        level = level + [level[-1]]
+    return [hash_pair(level[position], level[position + 1]) for position in range(0, len(level), 2)]
+
+
+def merkle_root(transactions):
+    """
+    Creates the Merkle root of the transactions of a block.
+    :param transactions: A list of dictionary object transactions.
+    :return: string - the root hash in hexadecimal string format.
+    """
+    level = [transaction_id(transaction) for transaction in transactions]
+    if not level:
+        return EMPTY_ROOT
+    while len(level) > 1:
+        level = next_level(level)
+    return level[0]
+
+
+def merkle_proof(transactions, position):
+    """
+    Creates the proof that a transaction is included in the Merkle tree of the transactions of a block.
+    :param transactions: A list of dictionary object transactions.
+    :param position: The position of the transaction in the list.
+    :return: list of lists - the sibling hash and its side ('left' or 'right') for each level of the tree.
+    """
+    proof = []
+    level = [transaction_id(transaction) for transaction in transactions]
+    while len(level) > 1:
+        if len(level) % 2:
+            level = level + [level[-1]]
+        if position % 2:
+            proof.append([level[position - 1], 'left'])
+        else:
+            proof.append([level[position + 1], 'right'])
+        level = next_level(level)
+        position //= 2
+    return proof
+
+
+def verify_merkle_proof(transaction, proof, root):
+    """
+    Checks that a transaction is included in a block from its Merkle proof and the Merkle root of the block.
+    :param transaction: The transaction as a dictionary.
+    :param proof: The sibling hashes and their sides from the leaf to the root.
+    :param root: The Merkle root of the block.
+    :return: boolean - True: if the proof leads to the root.
+                       False: if it does not.
+    """
+    node = transaction_id(transaction)
+    for sibling, side in proof:
+        node = hash_pair(sibling, node) if side == 'left' else hash_pair(node, sibling)
+    return node == root
@@ -0,0 +1,266 @@
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from time import perf_counter
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_value(value):
+    """
+    Formats a sample value in the Prometheus text format.
+    :param value: The value of the sample.
+    :return: string - the value, with +Inf for infinity.
+    """
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def format_labels(labelnames, labels):
+    """
+    Formats the labels of a sample in the Prometheus text format.
+    :param labelnames: The names of the labels.
+    :param labels: The values of the labels.
+    :return: string - the labels in braces, empty if there are none.
+    """
+    if not labelnames:
+        return ''
+    pairs = ','.join('{}="{}"'.format(name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+                     for name, value in zip(labelnames, labels))
+    return '{' + pairs + '}'
+
+
+class Metric:
+    """
+    Keeps the samples of a metric for each combination of label values.
+    The samples are updated under a lock with a few operations, so that recording them on the hot paths
+    costs next to nothing. A metric may read its samples from a function when it is collected instead.
+    """
+    kind = 'untyped'
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.function = function
+        self.values = {}
+        self.lock = Lock()
+
+    def samples(self):
+        """
+        Gets the samples of the metric.
+        :return: list of tuples - the name suffix, label names, label values and value of each sample.
+        """
+        if self.function is not None:
+            values = self.function()
+            values = values if self.labelnames else {(): values}
+        else:
+            with self.lock:
+                values = dict(self.values)
+        return [('', self.labelnames, labels, value) for labels, value in sorted(values.items())]
+
+    def render(self):
+        """
+        Renders the metric in the Prometheus text format.
+        :return: list of strings - the lines of the metric.
+        """
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for suffix, labelnames, labels, value in self.samples():
+            lines.append(f'{self.name}{suffix}{format_labels(labelnames, labels)} {format_value(value)}')
+        return lines
+
+
+class Counter(Metric):
+    """
+    Counts events, such as the attempts of the miner or the failed requests to a peer node.
+    """
+    kind = 'counter'
+
+    def inc(self, amount=1, labels=()):
+        """
+        Increases the counter.
+        :param amount: The amount to be added.
+        :param labels: The values of the labels of the sample.
+        :return: None.
+        """
+        with self.lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+
+class Gauge(Metric):
+    """
+    Holds a value which goes up and down, such as the height of the chain.
+    """
+    kind = 'gauge'
+
+    def set(self, value, labels=()):
+        """
+        Sets the value of the gauge.
+        :param value: The new value.
+        :param labels: The values of the labels of the sample.
+        :return: None.
+        """
+        with self.lock:
+            self.values[labels] = value
+
+
+class Histogram(Metric):
+    """
+    Counts the observed values, such as latencies, in cumulative buckets, with their sum and count.
+    """
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        """
+        Records an observed value.
+        :param value: The observed value.
+        :param labels: The values of the labels of the sample.
+        :return: None.
+        """
+        position = bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(labels)
+            if counts is None:
+                counts = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[position] += 1
+            counts[-1] += value
+
+    @contextmanager
+    def time(self, labels=()):
+        """
+        Records the duration of a block of code, or of each call of a function when used as a decorator.
+        :param labels: The values of the labels of the sample.
+        :return: None.
+        """
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(perf_counter() - start, labels)
+
+    def samples(self):
+        """
+        Gets the cumulative bucket counts, sum and count of the histogram.
+        :return: list of tuples - the name suffix, label names, label values and value of each sample.
+        """
+        with self.lock:
+            values = {labels: list(counts) for labels, counts in self.values.items()}
+        samples = []
+        labelnames = self.labelnames + ('le',)
+        for labels, counts in sorted(values.items()):
+            total = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                total += count
+                samples.append(('_bucket', labelnames, labels + (format_value(float(bound)),), total))
+            samples.append(('_sum', self.labelnames, labels, counts[-1]))
+            samples.append(('_count', self.labelnames, labels, total))
+        return samples
+
+
+class Registry:
+    """
+    Holds the metrics of the node process and renders them for the /metrics endpoint.
+    """
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        """
+        Adds a metric to the registry.
+        :param metric: The metric.
+        :return: The metric.
+        """
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        """
+        Renders all the metrics in the Prometheus text format.
+        :return: string - the metrics.
+        """
+        return '\n'.join(line for metric in self.metrics for line in metric.render()) + '\n'
+
+
+REGISTRY = Registry()
+POOLS = {}
+
+MINED_BLOCKS = REGISTRY.register(Counter(
+    'jiocoin_mined_blocks_total', 'Blocks mined by the node.'))
+MINING_ATTEMPTS = REGISTRY.register(Counter(
+    'jiocoin_mining_attempts_total', 'Nonces tried by the miner over all the mined blocks.'))
+MINING_BLOCK_ATTEMPTS = REGISTRY.register(Gauge(
+    'jiocoin_mining_block_attempts', 'Nonces tried to mine the last block.'))
+MINING_HASH_RATE = REGISTRY.register(Gauge(
+    'jiocoin_mining_hash_rate', 'Hashes per second while mining the last block.'))
+MINING_SECONDS = REGISTRY.register(Histogram(
+    'jiocoin_mining_seconds', 'Time spent searching the nonce of a block.'))
+SIGNATURES_VERIFIED = REGISTRY.register(Counter(
+    'jiocoin_signatures_verified_total', 'Transaction signatures checked, by result.', ('result',)))
+SIGNATURE_VERIFY_SECONDS = REGISTRY.register(Histogram(
+    'jiocoin_signature_verify_seconds', 'Time spent checking a transaction signature or a batch of them.'))
+LOAD_SECONDS = REGISTRY.register(Histogram(
+    'jiocoin_load_data_seconds', 'Time spent loading the blockchain from the database.'))
+SAVE_SECONDS = REGISTRY.register(Histogram(
+    'jiocoin_save_data_seconds', 'Time spent saving the changes of the blockchain to the database.'))
+CHAIN_HEIGHT = REGISTRY.register(Gauge(
+    'jiocoin_chain_height', 'Number of blocks in the local chain.'))
+MEMPOOL_SIZE = REGISTRY.register(Gauge(
+    'jiocoin_mempool_size', 'Number of open transactions waiting to be mined.'))
+PEER_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'jiocoin_peer_request_seconds', 'Latency of the requests to the peer nodes.', ('peer', 'path')))
+PEER_FAILURES = REGISTRY.register(Counter(
+    'jiocoin_peer_failures_total', 'Requests to the peer nodes which failed or timed out.', ('peer', 'path')))
+HTTP_REQUEST_SECONDS = REGISTRY.register(Histogram(
+    'jiocoin_http_request_seconds', 'Latency of the requests to the node, by route.', ('route', 'method', 'status')))
+
+
+def pool_stats(name):
+    """
+    Creates the function reading a statistic of the watched connection pools when the metrics are collected.
+    :param name: The name of the statistic in the stats of the pool.
+    :return: function - the function returning the statistic of each pool.
+    """
+    return lambda: {(pool_name,): pool.stats()[name] for pool_name, pool in sorted(POOLS.items())}
+
+
+for stat, name, kind, documentation in (
+        ('size', 'size', Gauge, 'Maximum number of open connections.'),
+        ('created', 'connections', Gauge, 'Open connections.'),
+        ('in_use', 'in_use', Gauge, 'Connections lent to the queries.'),
+        ('idle', 'idle', Gauge, 'Idle connections.'),
+        ('checkouts', 'checkouts_total', Counter, 'Connections lent since the pool was created.'),
+        ('waits', 'waits_total', Counter, 'Checkouts which waited for a free connection.'),
+        ('timeouts', 'timeouts_total', Counter, 'Checkouts which timed out.'),
+        ('wait_time', 'wait_seconds_total', Counter, 'Time spent waiting for a free connection.')):
+    REGISTRY.register(kind(f'jiocoin_db_pool_{name}', documentation, ('pool',), pool_stats(stat)))
+
+
+def record_mining(attempts, seconds):
+    """
+    Records the attempts and duration of the nonce search of a mined block.
+    :param attempts: The number of nonces tried.
+    :param seconds: The duration of the search.
+    :return: None.
+    """
+    MINED_BLOCKS.inc()
+    MINING_ATTEMPTS.inc(attempts)
+    MINING_BLOCK_ATTEMPTS.set(attempts)
+    MINING_SECONDS.observe(seconds)
+    if seconds > 0:
+        MINING_HASH_RATE.set(attempts / seconds)
+
+
+def watch_pool(name, pool):
+    """
+    Exposes the statistics of a database connection pool in the metrics.
+    :param name: The name of the pool in the metrics.
+    :param pool: The ConnectionPool object.
+    :return: None.
+    """
+    POOLS[name] = pool
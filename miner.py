@@ -0,0 +1,86 @@
+from multiprocessing import Event, Process, Queue, Value
+from os import cpu_count
+from queue import Empty
+from time import time
+
+from helper import BlockHasher
+
+STOP_CHECK_INTERVAL = 256
+
+
+def search_nonces(block, difficulty, start, step, found, results, attempts):
+    """
+    Tries the nonces start, start + step, start + 2 * step, ... in a worker process until a hash of the block
+    meets the difficulty or another worker finds one.
+    :param block: The block to be mined.
+    :param difficulty: The number of leading zeros required in the hash.
+    :param start: The first nonce tried by the worker.
+    :param step: The number of workers sharing the nonce space.
+    :param found: The event set when a worker finds a valid hash.
+    :param results: The queue the winning nonce, timestamp and hash are put into.
+    :param attempts: The shared counter of the hashes tried by all the workers.
+    :return: None.
+    """
+    hasher = BlockHasher(block)
+    target = '0' * difficulty
+    nonce = start
+    count = 0
+    while count % STOP_CHECK_INTERVAL or not found.is_set():
+        timestamp = str(time())
+        block_hash = hasher.hash(nonce, timestamp)
+        count += 1
+        if block_hash[:difficulty] == target:
+            found.set()
+            results.put((nonce, timestamp, block_hash))
+            break
+        nonce += step
+    with attempts.get_lock():
+        attempts.value += count
+
+
+def mine(block, difficulty, workers=None):
+    """
+    Finds a nonce for which the hash of the block meets the difficulty. The nonce space is split across worker
+    processes hashing with a BlockHasher, and all the workers stop as soon as one of them finds a valid hash.
+    :param block: The block to be mined.
+    :param difficulty: The number of leading zeros required in the hash.
+    :param workers: The number of worker processes, the number of CPU cores if None.
+    :return: tuple - the winning nonce, the timestamp and hash of the block with that nonce,
+             and the number of hashes tried.
+    """
+    workers = workers or cpu_count() or 1
+    target = '0' * difficulty
+    if workers == 1:
+        hasher = BlockHasher(block)
+        nonce, timestamp = block.nonce, block.timestamp
+        block_hash = hasher.hash(nonce, timestamp)
+        attempts = 1
+        while not block_hash[:difficulty] == target:
+            nonce += 1
+            timestamp = str(time())
+            block_hash = hasher.hash(nonce, timestamp)
+            attempts += 1
+        return nonce, timestamp, block_hash, attempts
+
+    found = Event()
+    results = Queue()
+    attempts = Value('q', 0)
+    processes = [Process(target=search_nonces,
+                         args=(block, difficulty, start, workers, found, results, attempts),
+                         daemon=True)
+                 for start in range(workers)]
+    for process in processes:
+        process.start()
+    try:
+        while True:
+            try:
+                nonce, timestamp, block_hash = results.get(timeout=0.5)
+                break
+            except Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    raise RuntimeError('All the mining workers exited without finding a valid hash')
+    finally:
+        found.set()
+        for process in processes:
+            process.join()
+    return nonce, timestamp, block_hash, attempts.value
@@ -0,0 +1,108 @@
+from hashlib import sha256
+from json import dumps, loads
+
+from ledger import Ledger
+
+SNAPSHOT_INTERVAL = 1000
+SNAPSHOTS_KEPT = 2
+
+
+def state_digest(height, tip_hash, balances):
+    """
+    Creates the digest of the account state at a height of the chain.
+    The balances are rounded to 8 decimals and the zero balances are left out, so that the same state reached
+    by replaying the chain or by reverting and applying blocks has the same digest.
+    :param height: The height of the chain the state belongs to.
+    :param tip_hash: The hash of the block at that height.
+    :param balances: The balance of every address as a dictionary.
+    :return: string - the digest in hexadecimal string format.
+    """
+    digest = sha256(f'{height}|{tip_hash}'.encode('utf-8'))
+    for address in sorted(balances):
+        balance = round(balances[address], 8) + 0.0
+        if balance:
+            digest.update(f'|{address}:{balance:.8f}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+class Snapshot:
+    """
+    Holds the balance of every address at a height of the chain, with the hash of the block at that height and
+    the digest of the state. A node starts from a snapshot and replays only the blocks after it, instead of
+    the whole chain.
+    """
+    def __init__(self, height, tip_hash, balances, digest=None):
+        self.height = height
+        self.tip_hash = tip_hash
+        self.balances = dict(balances)
+        self.digest = digest or state_digest(height, tip_hash, self.balances)
+
+    def __repr__(self):
+        """
+        Returns the height, tip hash and digest of the snapshot as a string.
+        :return: string - snapshot attributes
+        """
+        return f'Snapshot(height={self.height}, tip_hash={self.tip_hash}, digest={self.digest})'
+
+    def is_intact(self):
+        """
+        Checks that the digest of the snapshot matches its height, tip hash and balances.
+        :return: boolean - True: if the digest matches.
+                           False: if the snapshot is corrupted.
+        """
+        return self.digest == state_digest(self.height, self.tip_hash, self.balances)
+
+    def matches(self, chain):
+        """
+        Checks that the snapshot belongs to a chain.
+        :param chain: The list of blocks.
+        :return: boolean - True: if the block of the chain at the height of the snapshot has its tip hash.
+                           False: if the chain is shorter or forks before that height.
+        """
+        return 0 < self.height <= len(chain) and chain[self.height - 1].hash == self.tip_hash
+
+    def verify(self, chain):
+        """
+        Checks the snapshot against a full replay of the chain up to its height.
+        :param chain: The list of blocks.
+        :return: boolean - True: if the replayed state has the digest of the snapshot.
+                           False: if the snapshot does not belong to the chain or its balances differ.
+        """
+        if not self.matches(chain):
+            return False
+        ledger = Ledger()
+        ledger.rebuild(chain[:self.height])
+        return state_digest(self.height, self.tip_hash, ledger.balances) == self.digest
+
+    def encode_balances(self):
+        """
+        Encodes the balances of the snapshot to be saved in the database.
+        :return: bytes - the balances as JSON.
+        """
+        return dumps(self.balances, sort_keys=True).encode('utf-8')
+
+    def to_dict(self):
+        """
+        Converts the snapshot to a dictionary to be sent to the peer nodes.
+        :return: dictionary - the snapshot attributes.
+        """
+        return {'height': self.height, 'hash': self.tip_hash, 'digest': self.digest, 'balances': self.balances}
+
+    @staticmethod
+    def from_dict(values):
+        """
+        Creates a snapshot from a dictionary received from a peer node.
+        :param values: The snapshot attributes.
+        :return: Snapshot object
+        :raises KeyError, TypeError, ValueError: if an attribute is missing or invalid.
+        """
+        return Snapshot(int(values['height']), values['hash'], values['balances'], values['digest'])
+
+    @staticmethod
+    def from_row(row):
+        """
+        Creates a snapshot from a row of the snapshots table.
+        :param row: The row as a dictionary.
+        :return: Snapshot object
+        """
+        return Snapshot(row['id'], row['hash'], loads(bytes(row['balances']).decode('utf-8')), row['digest'])
@@ -1,115 +1,206 @@
-import mysql.connector as sql
-from mysql.connector import Error
+from threading import Lock
 
-from config import _mysql_user, _mysql_password
-from helper import is_json
+SCHEMAS = {
+    'users': (("email", "VARCHAR", 50, "UNIQUE"),
+              ("name", "VARCHAR", 50, ""),
+              ("node", "VARCHAR", 80, "UNIQUE"),
+              ("password", "VARCHAR", 100, ""),
+              ("public_key", "VARCHAR", 2048, ""),
+              ("has_wallet", "BOOL", "", ""),
+              ("db_created", "BOOL", "", "")),
+    'blockchain': (("id", "INT", 100, ""),
+                   ("hash", "VARCHAR", 100, "UNIQUE"),
+                   ("previous_hash", "VARCHAR", 100, "UNIQUE"),
+                   ("nonce", "INT", 10, ""),
+                   ("timestamp", "VARCHAR", 20, ""),
+                   ("merkle_root", "VARCHAR", 64, ""),
+                   ("body", "LONGBLOB", "", "")),
+    'open_transactions': (("tx_id", "VARCHAR", 64, ""),
+                          ("id", "INT", 100, ""),
+                          ("sender", "VARCHAR", 50, ""),
+                          ("recipient", "VARCHAR", 50, ""),
+                          ("amount", "FLOAT", 20, ""),
+                          ("signature", "VARCHAR", 2048, ""),
+                          ("nonce", "INT", 20, "")),
+    'transactions': (("tx_id", "VARCHAR", 64, ""),
+                     ("block", "INT", 100, "")),
+    'balances': (("address", "VARCHAR", 50, ""),
+                 ("balance", "FLOAT", 53, "")),
+    'meta': (("name", "VARCHAR", 50, ""),
+             ("value", "VARCHAR", 100, "")),
+    'snapshots': (("id", "INT", 100, ""),
+                  ("hash", "VARCHAR", 100, ""),
+                  ("digest", "VARCHAR", 64, ""),
+                  ("balances", "LONGBLOB", "", "")),
+}
+
+_known_tables = set()
+_known_tables_lock = Lock()
+
+
+class MySQLDialect:
+    """
+    Builds the parts of the queries which are specific to MySQL.
+    """
+    placeholder = '%s'
+
+    @staticmethod
+    def cursor(conn):
+        """
+        Opens a cursor which returns the rows as dictionaries.
+        :param conn: The MySQL connection object.
+        :return: MySQL cursor object
+        """
+        return conn.cursor(buffered=True, dictionary=True)
+
+    @staticmethod
+    def table_exists(table_name):
+        """
+        Builds the query counting the tables of the database with a name.
+        :param table_name: The name of the table.
+        :return: tuple - the query and its parameters.
+        """
+        return 'SELECT COUNT(*) AS count FROM information_schema.tables ' \
+               'WHERE table_schema = DATABASE() AND table_name = %s;', (table_name,)
+
+    @staticmethod
+    def upsert(key, columns):
+        """
+        Builds the clause which updates the row with the same key instead of inserting a new row.
+        :param key: The primary key column of the table.
+        :param columns: The columns to be updated.
+        :return: string - the clause appended to the INSERT query.
+        """
+        columns_to_be_updated = ', '.join([f'{column_name} = VALUES({column_name})' for column_name in columns])
+        return f'ON DUPLICATE KEY UPDATE {columns_to_be_updated}'
+
+
+class SQLiteDialect:
+    """
+    Builds the parts of the queries which are specific to SQLite.
+    """
+    placeholder = '?'
+
+    @staticmethod
+    def cursor(conn):
+        """
+        Opens a cursor. The connections of the SQLite backend already return the rows as dictionaries.
+        :param conn: The SQLite connection object.
+        :return: SQLite cursor object
+        """
+        return conn.cursor()
+
+    @staticmethod
+    def table_exists(table_name):
+        """
+        Builds the query counting the tables of the database with a name.
+        :param table_name: The name of the table.
+        :return: tuple - the query and its parameters.
+        """
+        return "SELECT COUNT(*) AS count FROM sqlite_master WHERE type = 'table' AND name = ?;", (table_name,)
+
+    @staticmethod
+    def upsert(key, columns):
+        """
+        Builds the clause which updates the row with the same key instead of inserting a new row.
+        :param key: The primary key column of the table.
+        :param columns: The columns to be updated.
+        :return: string - the clause appended to the INSERT query.
+        """
+        columns_to_be_updated = ', '.join([f'{column_name} = excluded.{column_name}' for column_name in columns])
+        return f'ON CONFLICT ({key}) DO UPDATE SET {columns_to_be_updated}'
 
 
 class Table:
     """
     Checks whether the user is a new user.
-    Executes the MySQL queries to-
+    Executes the SQL queries, in the dialect of the storage backend of the database, to-
         * Check the existence of a table.
         * Create a new table.
         * Get all the data from a table.
         * Get the data from specific rows in a table using search value.
         * Insert new data(row) into the table.
+        * Insert or update data(row) in the table.
         * Delete specific data(rows) from the table.
+        * Delete a range of data(rows) from the table.
         * Delete all the data from the table.
         * Update a row in the table with new values.
     """
     def __init__(self, table_name, mysql, *args):
         self.table_name = table_name
         self.mysql = mysql
-        self.columns = args
+        self.columns = args or SCHEMAS[table_name]
+        self.dialect = mysql.dialect
         self.create_new_table()
 
-    def sql_operations(self, operation, query):
+    def sql_operations(self, operation, query, params=None):
         """
-        Establishes connection with MySQL server and executes the MySQL query.
-        :param operation: Operation to be performed on the MySQL database.
-        :param query: MySQL query for different operations on MySQL database.
+        Borrows a connection from the connection pool of the database and executes the SQL query.
+        The query is committed unless it is executed inside a transaction of the pool.
+        :param operation: Operation to be performed on the database.
+        :param query: SQL query for different operations on the database.
+        :param params: The values bound to the placeholders of the query, if any.
         :return: dictionary - a row as a dictionary to get data from a specific row.
                  a list of dictionaries - the rows as a list of dictionaries to get all the data from the table.
                  boolean - True: if operations execute successfully.
         """
-        if self.table_name == 'users':
-            cur = self.mysql.connection.cursor()
-        else:
-            cur = self.mysql.cursor(buffered=True, dictionary=True)
-        cur.execute(query)
-        if operation == 'get_all':
-            result = cur.fetchall()
-        elif operation == 'get_one':
-            result = cur.fetchone()
-        elif self.table_name == 'users':
-            self.mysql.connection.commit()
-            result = True
-        else:
-            self.mysql.commit()
-            result = True
-        cur.close()
+        with self.mysql.connection() as conn:
+            cur = self.dialect.cursor(conn)
+            try:
+                cur.execute(query, params or ())
+                if operation == 'get_all':
+                    result = cur.fetchall()
+                elif operation == 'get_one':
+                    result = cur.fetchone()
+                else:
+                    if not self.mysql.in_transaction():
+                        conn.commit()
+                    result = True
+            finally:
+                cur.close()
         return result
 
     def is_new_table(self):
         """
-        Checks whether a table is new.
+        Checks whether a table is new from the metadata of the database, without reading the table.
         :return: boolean - True: if the table is new.
                            False: if the table already exists.
         """
-        if self.table_name == 'users':
-            cur = self.mysql.connection.cursor()
-        else:
-            cur = self.mysql.cursor(buffered=True)
-        try:
-            cur.execute(f'SELECT * FROM {self.table_name};')
-            return False
-        except Exception as e:
-            x = e.args[0]
-            if x == 1146:
-                return True
-            else:
-                raise e
-        finally:
-            cur.close()
+        query, params = self.dialect.table_exists(self.table_name)
+        result = self.sql_operations('get_one', query, params)
+        return result['count'] == 0
 
     @staticmethod
-    def create_db(db_name):
+    def create_db(db_name, mysql):
         """
         creates a database for the blockchain
+        :param db_name: The name of the database.
+        :param mysql: The connection pool used to connect to the database server.
         :return: boolean - True: if the database is created without any error.
                            False: if the database is not created because of any error.
         """
-        conn = sql.connect(
-            host='localhost',
-            user=_mysql_user,
-            password=_mysql_password
-        )
-        cur = conn.cursor()
-        try:
-            cur.execute(f"CREATE DATABASE {db_name}")
-            return 1
-        except Error as e:
-            x = e.args[0]
-            if x == 1007:
-                return 1
-            else:
-                return 0
-        finally:
-            cur.close()
+        return mysql.create_database(db_name)
 
     def create_new_table(self):
         """
         Creates a new table if a table of the same name does not exists.
+        The check runs once per database and table in the process, later instances reuse the result.
         :return: None.
         """
-        if self.is_new_table():
-            column_headers = ', '.join([f'{column_name} {data_type}'
-                                        if data_type == 'JSON' or data_type == 'BOOL'
-                                        else f'{column_name} {data_type}({size}) {constraint}'
-                                        for column_name, data_type, size, constraint in self.columns])
-            query = f'CREATE TABLE {self.table_name} ({column_headers}, PRIMARY KEY ({self.columns[0][0]}));'
-            self.sql_operations('create', query)
+        key = (self.mysql.database, self.table_name)
+        if key in _known_tables:
+            return
+        with _known_tables_lock:
+            if key in _known_tables:
+                return
+            if self.is_new_table():
+                column_headers = ', '.join([f'{column_name} {data_type}'
+                                            if data_type in ('JSON', 'BOOL', 'LONGBLOB')
+                                            else f'{column_name} {data_type}({size}) {constraint}'
+                                            for column_name, data_type, size, constraint in self.columns])
+                query = f'CREATE TABLE {self.table_name} ({column_headers}, PRIMARY KEY ({self.columns[0][0]}));'
+                self.sql_operations('create', query)
+            _known_tables.add(key)
 
     def get_all_data(self):
         """
@@ -129,6 +220,16 @@ class Table:
         result = self.sql_operations('get_all', query)
         return result
 
+    def get_columns(self, *column_names):
+        """
+        Get some columns of all the rows of a table.
+        :param column_names: The names of the columns.
+        :return: a list of dictionaries - the rows with these columns as a list of dictionaries.
+        """
+        query = f'SELECT {", ".join(column_names)} FROM {self.table_name};'
+        result = self.sql_operations('get_all', query)
+        return result
+
     def get_one(self, search, value):
         """
         Gets the data from specific row or rows in a table using search value.
@@ -136,19 +237,31 @@ class Table:
         :param value: The value of the column to identify the specific row in the table.
         :return: dictionary - the row as a dictionary.
         """
-        query = f'SELECT * FROM {self.table_name} WHERE {search} = "{value}";'
-        result = self.sql_operations('get_one', query)
+        query = f'SELECT * FROM {self.table_name} WHERE {search} = {self.dialect.placeholder};'
+        result = self.sql_operations('get_one', query, (value,))
         return result
 
     def insert_data(self, *args):
         """
-        Inserts new data(a new row) into the table.
+        Inserts new data(a new row) into the table. The values are bound to the query as parameters, so that
+        binary values are stored as they are.
         :param args: A list of values to be inserted as a new row to the table.
         :return: None.
         """
-        values = ', '.join([f'"{arg}"' if not is_json(arg) else f"'{arg}'" for arg in args])
+        values = ', '.join([self.dialect.placeholder] * len(args))
         query = f'INSERT INTO {self.table_name} VALUES ({values});'
-        self.sql_operations('insert', query)
+        self.sql_operations('insert', query, args)
+
+    def upsert_data(self, *args):
+        """
+        Inserts new data(a new row) into the table, or updates the row with the same key with the new values.
+        :param args: A list of values to be inserted or updated as a row of the table.
+        :return: None.
+        """
+        values = ', '.join([self.dialect.placeholder] * len(args))
+        update = self.dialect.upsert(self.columns[0][0], [column_name for column_name, _, _, _ in self.columns[1:]])
+        query = f'INSERT INTO {self.table_name} VALUES ({values}) {update};'
+        self.sql_operations('upsert', query, args)
 
     def delete_one(self, search, value):
         """
@@ -157,8 +270,18 @@ class Table:
         :param value: The value of the column to identify the row to be deleted.
         :return: None.
         """
-        query = f'DELETE FROM {self.table_name} WHERE {search} = "{value}";'
-        self.sql_operations('delete_one', query)
+        query = f'DELETE FROM {self.table_name} WHERE {search} = {self.dialect.placeholder};'
+        self.sql_operations('delete_one', query, (value,))
+
+    def delete_range(self, search, value):
+        """
+        Delete the rows from the table whose column value is greater than or equal to the given value.
+        :param search: The column header helps construct the condition to identify the rows to be deleted.
+        :param value: The lowest value of the column for the rows to be deleted.
+        :return: None.
+        """
+        query = f'DELETE FROM {self.table_name} WHERE {search} >= {self.dialect.placeholder};'
+        self.sql_operations('delete_range', query, (value,))
 
     def delete_all_data(self):
         """
@@ -167,6 +290,7 @@ class Table:
         """
         query = f'DROP TABLE {self.table_name};'
         self.sql_operations('delete_all', query)
+        _known_tables.discard((self.mysql.database, self.table_name))
         self.create_new_table()
 
     def update_table(self, condition, *args):
@@ -178,10 +302,10 @@ class Table:
         updated with the provided values.
         :return: None.
         """
-        columns_to_be_updated = ', '.join([f'{column_name} = "{value}"' for column_name, value in args])
+        columns_to_be_updated = ', '.join([f'{column_name} = {self.dialect.placeholder}' for column_name, _ in args])
         column, val = condition
-        query = f'UPDATE {self.table_name} SET {columns_to_be_updated} WHERE {column} = "{val}";'
-        self.sql_operations('update', query)
+        query = f'UPDATE {self.table_name} SET {columns_to_be_updated} WHERE {column} = {self.dialect.placeholder};'
+        self.sql_operations('update', query, tuple(value for _, value in args) + (val,))
 
     def is_new_user(self, email):
         """
@@ -198,15 +322,7 @@ class Table:
 
 
 def nodes(mysql, email):
-    users = Table("users", mysql,
-                  ("email", "VARCHAR", 50, "UNIQUE"),
-                  ("name", "VARCHAR", 50, ""),
-                  ("node", "VARCHAR", 80, "UNIQUE"),
-                  ("password", "VARCHAR", 100, ""),
-                  ("public_key", "VARCHAR", 2048, ""),
-                  ("has_wallet", "BOOL", "", ""),
-                  ("db_created", "BOOL", "", "")
-                  )
+    users = Table("users", mysql)
     node_list = users.get_one_column('node')
     node_list = [node['node'] for node in node_list]
     user_node = users.get_one('email', email)
@@ -0,0 +1,70 @@
+import os
+import sqlite3
+
+from db_pool import ConnectionPool, MySQLPool
+from sql_util import SQLiteDialect
+
+BACKENDS = ('mysql', 'sqlite')
+
+
+def dict_factory(cursor, row):
+    """
+    Converts a row fetched from SQLite to a dictionary of its columns.
+    :param cursor: The SQLite cursor which fetched the row.
+    :param row: The row as a tuple.
+    :return: dictionary - the row as a dictionary.
+    """
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+
+class SQLitePool(ConnectionPool):
+    """
+    Keeps a bounded number of open connections to an embedded SQLite database file and lends them to the queries.
+    The database runs in write-ahead logging mode, so that the readers do not block the writer and the writes
+    do not wait for a full sync. The database file is created when it is first opened.
+    """
+    dialect = SQLiteDialect
+    errors = (sqlite3.Error,)
+
+    def connect(self):
+        """
+        Opens a new connection to the SQLite database file of the pool.
+        :return: SQLite connection object
+        """
+        conn = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        conn.row_factory = dict_factory
+        conn.execute('PRAGMA journal_mode=WAL;')
+        conn.execute('PRAGMA synchronous=NORMAL;')
+        return conn
+
+    def ping(self, conn):
+        """
+        Embedded connections do not drop, so an idle connection needs no check.
+        :param conn: The SQLite connection object taken from the pool.
+        :return: None.
+        """
+
+    def create_database(self, db_name):
+        """
+        The SQLite database files are created when they are first opened, so there is nothing to create.
+        :param db_name: The name of the database.
+        :return: boolean - True.
+        """
+        return 1
+
+
+def open_storage(backend, database, size=5, timeout=10, directory='.'):
+    """
+    Creates the connection pool of a database on a storage backend.
+    :param backend: The storage backend, one of BACKENDS.
+    :param database: The name of the database. The SQLite backend stores it in the file <database>.sqlite3.
+    :param size: The maximum number of open connections.
+    :param timeout: The number of seconds to wait for a connection, or for a locked SQLite database.
+    :param directory: The directory of the SQLite database files.
+    :return: ConnectionPool object
+    """
+    if backend == 'mysql':
+        return MySQLPool(database, size, timeout)
+    if backend == 'sqlite':
+        return SQLitePool(os.path.join(directory, f'{database}.sqlite3'), size, timeout)
+    raise ValueError(f'Unknown storage backend {backend}')
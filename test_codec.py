@@ -0,0 +1,71 @@
+import unittest
+
+from block import Block
+from codec import decode_block, decode_transaction, encode_block, encode_transaction
+from helper import ordered_dict
+from merkle import merkle_root
+from transaction import Transaction, transaction_id
+
+SIGNATURE = 'ab' * 128
+
+
+def make_block(transactions):
+    return Block.from_dict({'index': 1,
+                            'previous_hash': '0' * 62 + 'x0',
+                            'timestamp': '1700000000.0',
+                            'transactions': transactions,
+                            'hash': None,
+                            'nonce': 0})
+
+
+class TransactionCodecTest(unittest.TestCase):
+
+    def test_round_trip_keeps_the_id(self):
+        transaction = Transaction(3, 'a@jiocoin.test', 'b@jiocoin.test', 2.5, SIGNATURE).to_dict()
+        decoded, offset = decode_transaction(encode_transaction(transaction))
+        self.assertEqual(decoded, transaction)
+        self.assertEqual(offset, len(encode_transaction(transaction)))
+
+    def test_int_amount_is_stored_as_a_float(self):
+        transaction = Transaction(0, 'a@jiocoin.test', 'b@jiocoin.test', 2, SIGNATURE)
+        self.assertIsInstance(transaction.amount, float)
+        decoded, _ = decode_transaction(encode_transaction(transaction.to_dict()))
+        self.assertEqual(decoded['id'], transaction.id)
+
+    def test_uppercase_signature_is_lowercased(self):
+        transaction = Transaction(0, 'a@jiocoin.test', 'b@jiocoin.test', 1.0, SIGNATURE.upper())
+        self.assertEqual(transaction.signature, SIGNATURE)
+        self.assertEqual(transaction.id, Transaction(0, 'a@jiocoin.test', 'b@jiocoin.test', 1.0, SIGNATURE).id)
+        decoded, _ = decode_transaction(encode_transaction(transaction.to_dict()))
+        self.assertEqual(decoded['id'], transaction.id)
+
+    def test_invalid_signature_is_rejected(self):
+        for signature in ('xyz', 'abc', None):
+            with self.assertRaises((TypeError, ValueError)):
+                Transaction(0, 'a@jiocoin.test', 'b@jiocoin.test', 1.0, signature)
+
+
+class BlockCodecTest(unittest.TestCase):
+
+    def test_round_trip_keeps_the_merkle_root(self):
+        transactions = [{'index': 0, 'sender': 'a@jiocoin.test', 'recipient': 'b@jiocoin.test',
+                         'amount': 2, 'signature': SIGNATURE.upper(), 'nonce': 0},
+                        {'index': 1, 'sender': 'Jiocoin', 'recipient': 'a@jiocoin.test',
+                         'amount': 10, 'signature': '', 'nonce': 1}]
+        block = make_block(transactions)
+        decoded = decode_block(encode_block(block))
+        self.assertEqual(decoded.merkle_root, block.merkle_root)
+        self.assertEqual(merkle_root(decoded.transactions), block.merkle_root)
+        self.assertEqual(decoded.transactions, ordered_dict(transactions))
+        self.assertEqual([transaction['id'] for transaction in decoded.transactions],
+                         [transaction_id(transaction) for transaction in block.transactions])
+
+    def test_invalid_signature_is_rejected(self):
+        transactions = [{'index': 0, 'sender': 'a@jiocoin.test', 'recipient': 'b@jiocoin.test',
+                         'amount': 1.0, 'signature': 'not hex', 'nonce': 0}]
+        with self.assertRaises(ValueError):
+            make_block(transactions)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,64 @@
+import unittest
+
+from merkle import EMPTY_ROOT, hash_pair, merkle_proof, merkle_root, verify_merkle_proof
+from transaction import transaction_id
+
+
+def make_transactions(count):
+    return [{'index': position,
+             'sender': f'sender{position}@jiocoin.test',
+             'recipient': 'recipient@jiocoin.test',
+             'amount': float(position),
+             'signature': f'{position:04x}',
+             'nonce': position} for position in range(count)]
+
+
+class MerkleRootTest(unittest.TestCase):
+
+    def test_empty_block(self):
+        self.assertEqual(merkle_root([]), EMPTY_ROOT)
+
+    def test_single_transaction_is_its_own_root(self):
+        transactions = make_transactions(1)
+        self.assertEqual(merkle_root(transactions), transaction_id(transactions[0]))
+
+    def test_pairs_are_hashed_in_order(self):
+        ids = [transaction_id(transaction) for transaction in make_transactions(3)]
+        expected = hash_pair(hash_pair(ids[0], ids[1]), hash_pair(ids[2], ids[2]))
+        self.assertEqual(merkle_root(make_transactions(3)), expected)
+
+    def test_root_depends_on_every_transaction(self):
+        transactions = make_transactions(5)
+        tampered = [dict(transaction) for transaction in transactions]
+        tampered[3]['amount'] = 100.0
+        self.assertNotEqual(merkle_root(transactions), merkle_root(tampered))
+
+    def test_repeated_last_transaction_keeps_the_root(self):
+        # The reason blocks with repeated transactions are rejected by Blockchain.is_valid_block.
+        transactions = make_transactions(3)
+        self.assertEqual(merkle_root(transactions), merkle_root(transactions + transactions[-1:]))
+
+
+class MerkleProofTest(unittest.TestCase):
+
+    def test_every_transaction_has_a_valid_proof(self):
+        for count in range(1, 10):
+            transactions = make_transactions(count)
+            root = merkle_root(transactions)
+            for position, transaction in enumerate(transactions):
+                proof = merkle_proof(transactions, position)
+                self.assertTrue(verify_merkle_proof(transaction, proof, root), (count, position))
+
+    def test_proof_fails_for_another_transaction(self):
+        transactions = make_transactions(6)
+        proof = merkle_proof(transactions, 2)
+        self.assertFalse(verify_merkle_proof(transactions[3], proof, merkle_root(transactions)))
+
+    def test_proof_fails_for_another_root(self):
+        transactions = make_transactions(6)
+        proof = merkle_proof(transactions, 4)
+        self.assertFalse(verify_merkle_proof(transactions[4], proof, merkle_root(transactions[:5])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,135 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from fixtures import HOST, make_chain, make_storage
+from blockchain import Blockchain
+from ledger import Ledger
+from snapshot import Snapshot, state_digest
+from sql_util import Table
+from storage import SQLitePool
+
+
+def replay(chain):
+    ledger = Ledger()
+    ledger.rebuild(chain)
+    return ledger
+
+
+def rounded(balances):
+    return {address: round(balance, 8) for address, balance in balances.items() if round(balance, 8)}
+
+
+class StateDigestTest(unittest.TestCase):
+
+    def test_order_of_the_balances_is_ignored(self):
+        balances = {'a@jiocoin.test': 1.5, 'b@jiocoin.test': 2.0}
+        reordered = {'b@jiocoin.test': 2.0, 'a@jiocoin.test': 1.5}
+        self.assertEqual(state_digest(3, 'hash', balances), state_digest(3, 'hash', reordered))
+
+    def test_balances_are_rounded(self):
+        self.assertEqual(state_digest(3, 'hash', {'a@jiocoin.test': 0.1 + 0.2}),
+                         state_digest(3, 'hash', {'a@jiocoin.test': 0.3}))
+
+    def test_zero_balances_are_left_out(self):
+        self.assertEqual(state_digest(3, 'hash', {'a@jiocoin.test': 1.0, 'b@jiocoin.test': 1e-12}),
+                         state_digest(3, 'hash', {'a@jiocoin.test': 1.0}))
+
+    def test_digest_depends_on_the_state(self):
+        digest = state_digest(3, 'hash', {'a@jiocoin.test': 1.0})
+        self.assertNotEqual(digest, state_digest(4, 'hash', {'a@jiocoin.test': 1.0}))
+        self.assertNotEqual(digest, state_digest(3, 'other', {'a@jiocoin.test': 1.0}))
+        self.assertNotEqual(digest, state_digest(3, 'hash', {'a@jiocoin.test': 1.1}))
+
+
+class SnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.chain = make_chain(8, 2)
+        self.snapshot = Snapshot(5, self.chain[4].hash, replay(self.chain[:5]).balances)
+
+    def test_tampered_balances_are_not_intact(self):
+        self.assertTrue(self.snapshot.is_intact())
+        tampered = Snapshot(5, self.snapshot.tip_hash, dict(self.snapshot.balances, x=5.0), self.snapshot.digest)
+        self.assertFalse(tampered.is_intact())
+
+    def test_matches_the_chain_of_its_tip(self):
+        self.assertTrue(self.snapshot.matches(self.chain))
+        self.assertFalse(self.snapshot.matches(self.chain[:4]))
+        self.assertFalse(self.snapshot.matches(make_chain(8, 2)))
+        self.assertFalse(Snapshot(0, None, {}).matches(self.chain))
+
+    def test_verify_replays_the_chain(self):
+        self.assertTrue(self.snapshot.verify(self.chain))
+        wrong = Snapshot(5, self.chain[4].hash, replay(self.chain[:4]).balances)
+        self.assertTrue(wrong.is_intact())
+        self.assertFalse(wrong.verify(self.chain))
+        self.assertFalse(self.snapshot.verify(make_chain(8, 2)))
+
+    def test_round_trips(self):
+        copy = Snapshot.from_dict(self.snapshot.to_dict())
+        self.assertEqual((copy.height, copy.tip_hash, copy.digest), (5, self.chain[4].hash, self.snapshot.digest))
+        row = {'id': 5, 'hash': self.chain[4].hash, 'digest': self.snapshot.digest,
+               'balances': self.snapshot.encode_balances()}
+        self.assertTrue(Snapshot.from_row(row).is_intact())
+
+    def test_restore_replays_the_blocks_after_the_snapshot(self):
+        ledger = Ledger()
+        ledger.restore(self.snapshot.balances, self.chain[5:])
+        self.assertEqual(rounded(ledger.balances), rounded(replay(self.chain).balances))
+
+
+class BlockchainSnapshotTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.users = make_storage(self.directory, 'users')
+        self.chain = make_chain(10, 2)
+        blockchain = self.load()
+        for block in self.chain:
+            blockchain.chain.append(block)
+            blockchain.ledger.apply_block(block)
+            blockchain.save_data()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def load(self):
+        node_db = SQLitePool(os.path.join(self.directory, 'node.sqlite3'))
+        return Blockchain(HOST, self.users, node_db, difficulty=0, snapshot_interval=3)
+
+    def test_snapshots_are_taken_every_interval(self):
+        blockchain = self.load()
+        self.assertEqual(blockchain.snapshot_heights, [6, 9])
+        snapshot = blockchain.latest_snapshot()
+        self.assertEqual(snapshot.height, 9)
+        self.assertTrue(blockchain.verify_snapshot(snapshot))
+        self.assertIsNone(blockchain.latest_snapshot('0' * 64))
+        self.assertEqual(blockchain.latest_snapshot(blockchain.latest_snapshot().digest).height, 9)
+
+    def test_load_replays_the_blocks_after_the_saved_balances(self):
+        blockchain = self.load()
+        balances_db = Table('balances', blockchain.node_db)
+        meta_db = Table('meta', blockchain.node_db)
+        balances_db.delete_all_data()
+        for address, balance in replay(self.chain[:7]).balances.items():
+            balances_db.upsert_data(address, balance)
+        # Kept only if the stored balances are reused instead of replaying the whole chain.
+        balances_db.upsert_data('unknown@jiocoin.test', 5.0)
+        meta_db.upsert_data('balances_height', 7)
+        meta_db.upsert_data('balances_hash', self.chain[6].hash)
+
+        blockchain = self.load()
+        expected = dict(replay(self.chain).balances, **{'unknown@jiocoin.test': 5.0})
+        self.assertEqual(rounded(blockchain.ledger.balances), rounded(expected))
+        self.assertEqual(blockchain.saved_balances_tip, (10, self.chain[9].hash))
+
+    def test_load_restores_missing_balances_from_the_latest_snapshot(self):
+        Table('balances', self.load().node_db).delete_all_data()
+        blockchain = self.load()
+        self.assertEqual(rounded(blockchain.ledger.balances), rounded(replay(self.chain).balances))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,17 +1,209 @@
+from array import array
+from binascii import hexlify, unhexlify
+from collections.abc import Mapping, Sequence
+from hashlib import sha256
+from sys import intern
+from threading import Lock
+
+TRANSACTION_FIELDS = ('index', 'sender', 'recipient', 'amount', 'signature', 'nonce', 'id')
+
+_addresses = []
+_address_ids = {}
+_addresses_lock = Lock()
+
+
+def transaction_id(transaction):
+    """
+    Creates the content-addressed ID of a transaction from its sender, recipient, amount, signature and nonce.
+    The index of the transaction is not part of the ID. The nonce is not signed, so it is always 0 for the signed
+    transactions, whose ID then depends on their signed content only. The mining rewards use it to keep their IDs
+    unique.
+    :param transaction: The transaction as a dictionary.
+    :return: string - the ID in hexadecimal string format.
+    """
+    return sha256('|'.join([str(transaction['sender']),
+                            str(transaction['recipient']),
+                            str(transaction['amount']),
+                            str(transaction['signature']),
+                            str(transaction.get('nonce', 0))]).encode('utf-8')).hexdigest()
+
+
+def canonical_signature(signature):
+    """
+    Converts the signature of a transaction to the lowercase hexadecimal string the binary encoding decodes it to,
+    so that the transaction keeps its ID once it is encoded.
+    :param signature: The signature as a hexadecimal string.
+    :return: string - the signature in lowercase.
+    :raises TypeError, ValueError: if the signature is not a hexadecimal string.
+    """
+    if not isinstance(signature, str):
+        raise TypeError('The signature is not a string')
+    signature = signature.lower()
+    unhexlify(signature)
+    return signature
+
+
+def address_id(address):
+    """
+    Gets the number of an address in the table of addresses shared by all the columnar transaction stores,
+    adding the address to the table if it is new.
+    :param address: The address of a sender or recipient.
+    :return: int - the number of the address.
+    """
+    number = _address_ids.get(address)
+    if number is None:
+        with _addresses_lock:
+            number = _address_ids.get(address)
+            if number is None:
+                number = len(_addresses)
+                _addresses.append(intern(address))
+                _address_ids[_addresses[-1]] = number
+    return number
+
+
 class Transaction:
     """
     Initializes the instance attributes of a transaction  and returns the transaction as a string.
+    The ID of the transaction is derived from its content. The amount is converted to a float and the signature
+    to lowercase, as they are decoded from the binary encoding.
+    The attributes are kept in slots and the addresses are interned, so that the transactions sharing a sender
+    or recipient share its string.
     """
-    def __init__(self, index, sender, recipient, amount, signature):
+    __slots__ = TRANSACTION_FIELDS
+
+    def __init__(self, index, sender, recipient, amount, signature, nonce=0):
         self.index = index
-        self.sender = sender
-        self.recipient = recipient
-        self.amount = amount
-        self.signature = signature
+        self.sender = intern(sender)
+        self.recipient = intern(recipient)
+        self.amount = float(amount)
+        self.signature = canonical_signature(signature)
+        self.nonce = nonce
+        self.id = transaction_id({'sender': sender,
+                                  'recipient': recipient,
+                                  'amount': self.amount,
+                                  'signature': self.signature,
+                                  'nonce': nonce})
+
+    def to_dict(self):
+        """
+        Converts the transaction to a dictionary.
+        :return: dictionary - the transaction attributes.
+        """
+        return {field: getattr(self, field) for field in TRANSACTION_FIELDS}
 
     def __repr__(self):
         """
         Returns a dictionary of the Transaction object's attributes in the string format
         :return: string - transaction attributes
         """
-        return str(self.__dict__)
+        return str(self.to_dict())
+
+
+class TransactionColumns(Sequence):
+    """
+    Stores the transactions of a block column by column: the indexes, the numbers of the sender and recipient
+    addresses, the amounts and the nonces in typed arrays, and the raw signatures and IDs in contiguous bytes.
+    A transaction costs a few dozen bytes besides its signature and no Python objects, instead of a dictionary
+    holding about ten objects. The transactions are read through dictionary-like views.
+    """
+    __slots__ = ('indexes', 'senders', 'recipients', 'amounts', 'nonces', 'signatures', 'signature_ends', 'ids')
+
+    def __init__(self, transactions=()):
+        self.indexes = array('q')
+        self.senders = array('I')
+        self.recipients = array('I')
+        self.amounts = array('d')
+        self.nonces = array('q')
+        self.signature_ends = array('I')
+        signatures = bytearray()
+        ids = bytearray()
+        for transaction in transactions:
+            self.indexes.append(transaction['index'])
+            self.senders.append(address_id(transaction['sender']))
+            self.recipients.append(address_id(transaction['recipient']))
+            self.amounts.append(transaction['amount'])
+            self.nonces.append(transaction.get('nonce', 0))
+            signatures += unhexlify(transaction['signature'])
+            self.signature_ends.append(len(signatures))
+            ids += unhexlify(transaction_id(transaction))
+        self.signatures = bytes(signatures)
+        self.ids = bytes(ids)
+
+    def __len__(self):
+        return len(self.indexes)
+
+    def __iter__(self):
+        return (TransactionView(self, position) for position in range(len(self)))
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [TransactionView(self, item) for item in range(len(self))[position]]
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError('transaction index out of range')
+        return TransactionView(self, position)
+
+    def __eq__(self, other):
+        if not isinstance(other, Sequence):
+            return NotImplemented
+        return len(self) == len(other) and all(view == transaction for view, transaction in zip(self, other))
+
+    def field(self, position, name):
+        """
+        Reads a field of a transaction.
+        :param position: The position of the transaction in the block.
+        :param name: The name of the field, one of TRANSACTION_FIELDS.
+        :return: The value of the field.
+        :raises KeyError: if the field does not exist.
+        """
+        if name == 'index':
+            return self.indexes[position]
+        if name == 'sender':
+            return _addresses[self.senders[position]]
+        if name == 'recipient':
+            return _addresses[self.recipients[position]]
+        if name == 'amount':
+            return self.amounts[position]
+        if name == 'nonce':
+            return self.nonces[position]
+        if name == 'signature':
+            start = self.signature_ends[position - 1] if position else 0
+            return hexlify(self.signatures[start:self.signature_ends[position]]).decode('ascii')
+        if name == 'id':
+            return hexlify(self.ids[position * 32:(position + 1) * 32]).decode('ascii')
+        raise KeyError(name)
+
+    def to_dicts(self):
+        """
+        Converts the transactions to dictionaries, as they are sent to the peer nodes.
+        :return: list of dictionaries - the transactions.
+        """
+        return [dict(view) for view in self]
+
+    def __repr__(self):
+        return repr(self.to_dicts())
+
+
+class TransactionView(Mapping):
+    """
+    Reads a transaction of a columnar transaction store like a read-only dictionary, for the validation,
+    the templates and the conversion to JSON.
+    """
+    __slots__ = ('columns', 'position')
+
+    def __init__(self, columns, position):
+        self.columns = columns
+        self.position = position
+
+    def __getitem__(self, name):
+        return self.columns.field(self.position, name)
+
+    def __iter__(self):
+        return iter(TRANSACTION_FIELDS)
+
+    def __len__(self):
+        return len(TRANSACTION_FIELDS)
+
+    def __repr__(self):
+        return repr(dict(self))
@@ -1,16 +1,69 @@
 from Crypto.PublicKey import RSA
 from Crypto.Hash import SHA256
 from Crypto.Signature import pss
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from os import cpu_count
+from time import perf_counter
 import binascii
 
+from helper import LRUCache
+from metrics import SIGNATURE_VERIFY_SECONDS, SIGNATURES_VERIFIED
 from sql_util import Table
 
+BATCH_MIN_SIZE = 8
+
+
+def transaction_message(transaction):
+    """
+    Creates the message signed by the sender of a transaction.
+    :param transaction: The transaction as a dictionary.
+    :return: bytes - the encoded sender, recipient and amount of the transaction.
+    """
+    return (str(transaction['sender']) +
+            str(transaction['recipient']) +
+            str(transaction['amount'])).encode('utf-8')
+
+
+@lru_cache(maxsize=1024)
+def import_verifier(public_key):
+    """
+    Builds a signature verifier from a public key. Used by the worker processes of the batch verification,
+    which receive the public keys as strings.
+    :param public_key: The public key of the sender in PEM format.
+    :return: PSS signature verifier object.
+    """
+    return pss.new(RSA.import_key(public_key.encode('utf-8')))
+
+
+def verify_chunk(chunk):
+    """
+    Checks the signatures of a chunk of transactions in a worker process.
+    :param chunk: A list of tuples with the public key of the sender, the signed message and the signature.
+    :return: list of booleans - True for each valid signature, False for each invalid signature.
+    """
+    results = []
+    for public_key, message, signature in chunk:
+        try:
+            import_verifier(public_key).verify(SHA256.new(message), binascii.unhexlify(signature))
+            results.append(True)
+        except (ValueError, TypeError):
+            results.append(False)
+    return results
+
 
 class Wallet:
     """
     Creates, saves and loads RSA private-public key pair.
     Creates the transaction signature and validates the signature.
+    The verifiers built from the public keys of the senders and the signatures already verified are cached.
     """
+    public_keys = LRUCache(1024)
+    verifiers = LRUCache(1024)
+    verified_signatures = LRUCache(65536)
+    verify_workers = cpu_count() or 1
+    executor = None
+
     def __init__(self):
         self.private_key = None
         self.public_key = None
@@ -29,7 +82,7 @@ class Wallet:
         """
         Saves the private key to a separate file and adds public key to the users table in mysql database.
         :param port: Port through which node is accessed.
-        :param mysql: Bound MySQL connection object to connect to the server to update the users table.
+        :param mysql: The connection pool of the users database to update the users table.
         :param email: The email of the user used to identify the row to be modified.
         :return: boolean - True: if saves the key pair successfully.
                            False: if fails to save the key.
@@ -38,16 +91,9 @@ class Wallet:
             try:
                 with open(f'private_{port}.pem', mode='wb') as file_out:
                     file_out.write(self.private_key.encode('utf-8'))
-                users = Table("users", mysql,
-                              ("email", "VARCHAR", 50, "UNIQUE"),
-                              ("name", "VARCHAR", 50, ""),
-                              ("node", "VARCHAR", 80, "UNIQUE"),
-                              ("password", "VARCHAR", 100, ""),
-                              ("public_key", "VARCHAR", 2048, ""),
-                              ("has_wallet", "BOOL", "", ""),
-                              ("db_created", "BOOL", "", "")
-                              )
+                users = Table("users", mysql)
                 users.update_table(('email', email), ('public_key', self.public_key), ('has_wallet', 1))
+                Wallet.forget_sender(email)
                 return True
             except (IOError, IndexError):
                 return False
@@ -80,33 +126,127 @@ class Wallet:
         signature = pss.new(RSA.import_key(self.private_key.encode('utf-8'))).sign(hash_transaction)
         return binascii.hexlify(signature).decode('ascii')
 
+    @staticmethod
+    def get_public_key(sender, mysql):
+        """
+        Gets the public key of a sender, from the cache or from the users table.
+        A user without a wallet is not cached, since the wallet may be created on another node.
+        :param sender: The email of the sender.
+        :param mysql: The connection pool of the users database to access the public key of the sender.
+        :return: string - the public key in PEM format, None if the sender is not a user or has no wallet.
+        """
+        public_key = Wallet.public_keys.get(sender)
+        if public_key is None:
+            users = Table("users", mysql)
+            user = users.get_one("email", sender)
+            if user is None or not user['has_wallet']:
+                return None
+            public_key = user['public_key']
+            Wallet.public_keys.put(sender, public_key)
+        return public_key
+
+    @staticmethod
+    def get_verifier(sender, mysql):
+        """
+        Gets the signature verifier built from the public key of a sender, from the cache or from the users table.
+        :param sender: The email of the sender.
+        :param mysql: The connection pool of the users database to access the public key of the sender.
+        :return: PSS signature verifier object, None if the sender is not a user, has no wallet or has a public key
+                 which cannot be imported.
+        """
+        verifier = Wallet.verifiers.get(sender)
+        if verifier is None:
+            public_key = Wallet.get_public_key(sender, mysql)
+            if public_key is None:
+                return None
+            try:
+                verifier = pss.new(RSA.import_key(public_key.encode('utf-8')))
+            except (ValueError, IndexError, TypeError):
+                return None
+            Wallet.verifiers.put(sender, verifier)
+        return verifier
+
+    @staticmethod
+    def forget_sender(sender):
+        """
+        Removes the cached public key, verifier and verified signatures of a sender whose public key has changed.
+        :param sender: The email of the sender.
+        :return: None.
+        """
+        Wallet.public_keys.pop(sender)
+        Wallet.verifiers.pop(sender)
+        Wallet.verified_signatures.discard_if(lambda key: key[0] == sender)
+
     @staticmethod
     def verify_signature(transaction, mysql):
         """
         Checks if the signature over a transaction is valid.
+        A signature already verified for the same sender and transaction digest is not verified again.
+        The check is recorded in the metrics like a batch of one signature.
         :param transaction: The transaction whose signature has to be validated.
-        :param mysql: Bound MySQL connection object to connect to the server to access the public key of the sender.
+        :param mysql: The connection pool of the users database to access the public key of the sender.
         :return: boolean - True: if the signature is valid.
                            False: if the signature is not valid.
         """
-        users = Table("users", mysql,
-                      ("email", "VARCHAR", 50, "UNIQUE"),
-                      ("name", "VARCHAR", 50, ""),
-                      ("node", "VARCHAR", 80, "UNIQUE"),
-                      ("password", "VARCHAR", 100, ""),
-                      ("public_key", "VARCHAR", 2048, ""),
-                      ("has_wallet", "BOOL", "", ""),
-                      ("db_created", "BOOL", "", "")
-                      )
-        user = users.get_one("email", transaction['sender'])
-        public_key = user['public_key']
-        hash_transaction = SHA256.new((str(transaction['sender']) +
-                                       str(transaction['recipient']) +
-                                       str(transaction['amount']))
-                                      .encode('utf-8'))
-        verifier = pss.new(RSA.import_key(public_key.encode('utf-8')))
-        try:
-            verifier.verify(hash_transaction, binascii.unhexlify(transaction['signature']))
-            return True
-        except (ValueError, TypeError):
-            return False
+        start = perf_counter()
+        hash_transaction = SHA256.new(transaction_message(transaction))
+        verified_key = (transaction['sender'], hash_transaction.hexdigest(), transaction['signature'])
+        valid = verified_key in Wallet.verified_signatures
+        if not valid:
+            verifier = Wallet.get_verifier(transaction['sender'], mysql)
+            if verifier is not None:
+                try:
+                    verifier.verify(hash_transaction, binascii.unhexlify(transaction['signature']))
+                    Wallet.verified_signatures.put(verified_key, True)
+                    valid = True
+                except (ValueError, TypeError):
+                    pass
+
+        SIGNATURE_VERIFY_SECONDS.observe(perf_counter() - start)
+        SIGNATURES_VERIFIED.inc(labels=('valid' if valid else 'invalid',))
+        return valid
+
+    @staticmethod
+    def verify_signatures(transactions, mysql):
+        """
+        Checks the signatures over a batch of transactions. The signatures which are not already verified are split
+        into chunks and verified in parallel by a pool of worker processes. Small batches are verified in the
+        current process.
+        :param transactions: A list of transactions whose signatures have to be validated.
+        :param mysql: The connection pool of the users database to access the public keys of the senders.
+        :return: list of booleans - True for each transaction with a valid signature,
+                 False for each transaction with an invalid signature.
+        """
+        start = perf_counter()
+        results = [False] * len(transactions)
+        pending = []
+        for position, transaction in enumerate(transactions):
+            message = transaction_message(transaction)
+            verified_key = (transaction['sender'], SHA256.new(message).hexdigest(), transaction['signature'])
+            if verified_key in Wallet.verified_signatures:
+                results[position] = True
+                continue
+            public_key = Wallet.get_public_key(transaction['sender'], mysql)
+            if public_key is not None:
+                pending.append((position, verified_key, (public_key, message, transaction['signature'])))
+
+        if len(pending) < BATCH_MIN_SIZE or Wallet.verify_workers < 2:
+            verified = verify_chunk([item for _, _, item in pending])
+        else:
+            if Wallet.executor is None:
+                Wallet.executor = ProcessPoolExecutor(Wallet.verify_workers)
+            chunk_size = -(-len(pending) // Wallet.verify_workers)
+            chunks = [[item for _, _, item in pending[start:start + chunk_size]]
+                      for start in range(0, len(pending), chunk_size)]
+            verified = [valid for chunk in Wallet.executor.map(verify_chunk, chunks) for valid in chunk]
+
+        for (position, verified_key, _), valid in zip(pending, verified):
+            results[position] = valid
+            if valid:
+                Wallet.verified_signatures.put(verified_key, True)
+
+        SIGNATURE_VERIFY_SECONDS.observe(perf_counter() - start)
+        valid_count = sum(results)
+        SIGNATURES_VERIFIED.inc(valid_count, ('valid',))
+        SIGNATURES_VERIFIED.inc(len(results) - valid_count, ('invalid',))
+        return results